@@ -1,112 +1,185 @@
-from flask import Flask, request, jsonify, send_from_directory
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import Base, Guest
+import time
+IMPORT_STARTED = time.perf_counter()  # cold-start clock, before the heavy imports
+
+from flask import Flask, Response, request, jsonify, make_response
+from sqlalchemy import or_, update, delete, func
+from storage import Storage
+from models import Guest, MessageStatus, GUESTS_VERSION, ensure_counters, read_counter, record_guest_changes
+from dispatch import DispatchQueue
+from ratelimit import RateLimiter, parse_retry_after
+from bulk import BulkInviteRunner
+from http_clients import ProviderClients
+from phones import is_valid_phone, normalize_phone, plus_phone, wasender_phone, whatsapp_address
+from async_senders import AsyncSender
+from routing import REJECTED, THROTTLED, ProviderRouter, failed_send
+from group_commit import RsvpWriter
+from change_feed import ChangeFeed, latest_version
+from tokens import bearer_token, signer_from_env
+from delivery import StatusWriter, latest_status_by_guest, twilio_event, wasender_events
+from guest_import import GuestImporter, ImportInterrupted, iter_csv_rows, load_json_rows
+from guest_cache import GuestCache
+from gallery import GalleryManifest
+from static_delivery import StaticFiles, DAILY, IMMUTABLE
+from log_config import configure_logging, restart_after_fork as restart_logging_after_fork, sampled
+import metrics
 import random
 import string
 import os
 import logging
 import requests
 import json
-import time
+import hashlib
+import hmac
+import csv
+import io
+import atexit
 from datetime import datetime
 
-# Setup logging
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger(__name__)
-
-# Load environment variables - try multiple files
+# Load environment variables first so LOG_* settings in them apply - try multiple files
 env_files = ['production.env', 'development.env', '.env']
-env_loaded = False
+env_loaded = None
 
 try:
     from dotenv import load_dotenv
     for env_file in env_files:
         if os.path.exists(env_file):
             load_dotenv(env_file)
-            logger.info(f"✅ Loaded environment variables from {env_file}")
-            env_loaded = True
+            env_loaded = env_file
             break
-    if not env_loaded:
-        logger.warning(f"⚠️ No environment file found. Checked: {env_files}")
+    dotenv_available = True
 except ImportError:
+    dotenv_available = False
+
+# Setup logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+if not dotenv_available:
     logger.warning("⚠️ python-dotenv not installed. Using system environment variables.")
+elif env_loaded:
+    logger.info("✅ Loaded environment variables from %s", env_loaded)
+else:
+    logger.warning("⚠️ No environment file found. Checked: %s", env_files)
 
 app = Flask(__name__)
+metrics.instrument_app(app)
 
-# Database setup
-engine = create_engine('sqlite:///database.db')
-Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine)
+# Database setup - routes use the request-scoped Session, background workers SessionFactory.
+# Creating the engine does not connect; the schema is created once by create_app().
+storage = Storage()
+storage.init_app(app)
+engine = storage.engine
+Session = storage.Session
+SessionFactory = storage.session_factory
+metrics.instrument_engine(engine)
 
 # Multi-provider WhatsApp configuration
 WHATSAPP_PROVIDER = os.getenv('WHATSAPP_PROVIDER', 'wasender').lower()
 LOGIN_LINK = os.getenv('WEDDING_LOGIN_URL', "https://wedding-invitation.adkinsfamily.co.za/")
 
-logger.info(f"🔧 Environment check:")
-logger.info(f"   WHATSAPP_PROVIDER = {WHATSAPP_PROVIDER}")
-logger.info(f"   WASENDER_API_KEY = {'SET' if os.getenv('WASENDER_API_KEY') else 'NOT SET'}")
-logger.info(f"   AUTHKEY_API_KEY = {'SET' if os.getenv('AUTHKEY_API_KEY') else 'NOT SET'}")
+def http_settings(prefix, read_timeout=30.0):
+    """Connection pool size and timeouts for a provider, overridable per provider"""
+    return {
+        'pool_size': int(os.getenv(f'{prefix}_POOL_SIZE', os.getenv('HTTP_POOL_SIZE', 16))),
+        'connect_timeout': float(os.getenv(f'{prefix}_CONNECT_TIMEOUT', os.getenv('HTTP_CONNECT_TIMEOUT', 5))),
+        'read_timeout': float(os.getenv(f'{prefix}_READ_TIMEOUT', os.getenv('HTTP_READ_TIMEOUT', read_timeout)))
+    }
 
 # Provider configurations
 PROVIDERS = {
     'authkey': {
         'api_key': os.getenv('AUTHKEY_API_KEY'),
-        'api_url': 'https://api.authkey.io/request',
-        'sender_id': os.getenv('AUTHKEY_SENDER_ID', '91XXXXXXXXXX')
+        'api_url': os.getenv('AUTHKEY_API_URL', 'https://api.authkey.io/request'),
+        'sender_id': os.getenv('AUTHKEY_SENDER_ID', '91XXXXXXXXXX'),
+        'rate_limit': {
+            'per_minute': float(os.getenv('AUTHKEY_RATE_PER_MINUTE', 60)),
+            'burst': int(os.getenv('AUTHKEY_RATE_BURST', 5))
+        },
+        'http': http_settings('AUTHKEY')
     },
     'wasender': {
         'api_key': os.getenv('WASENDER_API_KEY'),
-        'api_url': 'https://www.wasenderapi.com/api/send-message'
+        'api_url': os.getenv('WASENDER_API_URL', 'https://www.wasenderapi.com/api/send-message'),
+        # Free trial allows 1 message per minute; raise these on a paid plan
+        'rate_limit': {
+            'per_minute': float(os.getenv('WASENDER_RATE_PER_MINUTE', 1)),
+            'burst': int(os.getenv('WASENDER_RATE_BURST', 1))
+        },
+        'http': http_settings('WASENDER')
     },
     'twilio': {
         'account_sid': os.getenv('TWILIO_ACCOUNT_SID'),
         'api_key': os.getenv('TWILIO_API_KEY_SID'),
         'api_secret': os.getenv('TWILIO_API_KEY_SECRET'),
-        'whatsapp_number': 'whatsapp:+14155238886'
+        'whatsapp_number': 'whatsapp:+14155238886',
+        # Public URL of /api/webhooks/twilio; Twilio only sends status callbacks when this is set
+        'status_callback': os.getenv('TWILIO_STATUS_CALLBACK_URL'),
+        'rate_limit': {
+            'per_minute': float(os.getenv('TWILIO_RATE_PER_MINUTE', 60)),
+            'burst': int(os.getenv('TWILIO_RATE_BURST', 1))
+        },
+        'http': http_settings('TWILIO')
     }
 }
 
-# ---------- Helpers ----------
-def normalize_phone(phone: str) -> str:
-    """Normalize phone numbers - ensure proper format for WasenderAPI"""
-    if not phone:
-        return ""
-    
-    # Clean the phone number
-    phone = phone.strip().replace(" ", "").replace("-", "")
-    
-    # Handle different input formats
-    if phone.startswith("+27"):
-        return phone  # Already correct: +27646191448
-    elif phone.startswith("27"):
-        return "+" + phone  # Add +: +27646191448
-    elif phone.startswith("0"):
-        return "+27" + phone[1:]  # Convert: +27646191448
-    else:
-        return "+27" + phone  # Assume SA number: +27646191448
+# Pooled keep-alive clients shared by every sender thread
+provider_clients = ProviderClients(PROVIDERS)
 
+# Shared across threads and processes through the database
+rate_limiter = RateLimiter(SessionFactory, PROVIDERS)
+
+# ---------- Helpers ----------
 def generate_password(length=8):
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
 
+def build_invite_message(guest_name, guest_password):
+    return f"""🌟 You're invited to the best wedding this galaxy has ever experienced! 🚀
+
+Hi {guest_name}! 💍
+
+You're cordially invited to join us for our special day.
+
+📱 RSVP: {LOGIN_LINK}
+📱 Username: Your cell number
+🔐 Your password: {guest_password}
+
+📅 Date: Sunday, September 28th, 2025
+📍 Venue: Carmel Coastal Retreat
+🕐 Time: 12:00 PM - Midday
+
+Can't wait to celebrate with you! ✨
+
+Love,
+The Happy Couple 💕"""
+
 # ---------- WhatsApp Senders ----------
 def send_whatsapp_message(phone, message):
+    """Send through the provider router, failing over between configured providers"""
     try:
-        provider = WHATSAPP_PROVIDER.lower()
-        logger.info(f"🔧 Using provider: {provider}")
-
-        if provider == 'authkey':
-            return send_authkey_message(phone, message)
-        elif provider == 'wasender':
-            return send_wasender_message(phone, message)
-        elif provider == 'twilio':
-            return send_twilio_message(phone, message)
-        else:
-            logger.error(f"❌ Unknown provider: {provider}")
-            return False
+        return provider_router.send(phone, message)
     except Exception as e:
-        logger.error(f"❌ send_whatsapp_message exception: {e}", exc_info=True)
+        logger.error("❌ send_whatsapp_message exception: %s", e, exc_info=True)
+        return False
+
+def send_via_provider(provider, phone, message):
+    """Rate-limited, timed send through one specific provider"""
+    logger.debug("🔧 Using provider: %s", provider)
+    waited = time.perf_counter()
+    rate_limiter.acquire(provider)
+    started = time.perf_counter()
+    metrics.ratelimit_wait_seconds.inc(provider, amount=started - waited)
+
+    if provider == 'authkey':
+        ok = send_authkey_message(phone, message)
+    elif provider == 'wasender':
+        ok = send_wasender_message(phone, message)
+    elif provider == 'twilio':
+        ok = send_twilio_message(phone, message)
+    else:
+        logger.error("❌ Unknown provider: %s", provider)
         return False
+    metrics.record_send(provider, ok, time.perf_counter() - started)
+    return ok
 
 def send_authkey_message(phone, message):
     try:
@@ -115,8 +188,7 @@ def send_authkey_message(phone, message):
             logger.warning("⚠️ Authkey API key not configured")
             return False
 
-        if not phone.startswith('+'):
-            phone = '+' + phone
+        phone = plus_phone(phone)
 
         payload = {
             "authkey": config['api_key'],
@@ -128,22 +200,28 @@ def send_authkey_message(phone, message):
         }
 
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        logger.info(f"📱 Sending via Authkey to {phone}")
-        response = requests.post(config['api_url'], data=payload, headers=headers)
+        logger.debug("📱 Sending via Authkey to %s", phone)
+        response = provider_clients.session('authkey').post(
+            config['api_url'], data=payload, headers=headers, timeout=provider_clients.timeout('authkey'))
+
+        if response.status_code == 429:
+            rate_limiter.penalize('authkey', parse_retry_after(response))
+            return THROTTLED
 
         if response.status_code == 200:
             result = response.json()
             if result.get('Status') == 'success':
-                logger.info(f"✅ Authkey message sent: {result}")
+                logger.info("✅ Authkey message sent: %s", result, extra=sampled('send'))
+                status_writer.track('authkey', result.get('LogID'), phone)
                 return True
             else:
-                logger.error(f"❌ Authkey error: {result}")
+                logger.error("❌ Authkey error: %s", result)
                 return False
         else:
-            logger.error(f"❌ Authkey HTTP error: {response.status_code}")
-            return False
+            logger.error("❌ Authkey HTTP error: %s", response.status_code)
+            return failed_send(response.status_code)
     except Exception as e:
-        logger.error(f"❌ Authkey exception: {e}", exc_info=True)
+        logger.error("❌ Authkey exception: %s", e, exc_info=True)
         return False
 
 def send_wasender_message(phone, message):
@@ -156,17 +234,11 @@ def send_wasender_message(phone, message):
             logger.warning("⚠️ WasenderAPI API key not configured")
             return False
 
-        # Fix phone number format - WasenderAPI needs country code without +
-        clean_phone = phone.replace('+', '').replace('-', '').replace(' ', '')
-        
-        # Ensure it starts with country code (27 for South Africa)
-        if clean_phone.startswith('0'):
-            clean_phone = '27' + clean_phone[1:]  # Convert 0646191448 to 27646191448
-        elif not clean_phone.startswith('27'):
-            clean_phone = '27' + clean_phone  # Add country code if missing
+        # WasenderAPI needs country code without +
+        clean_phone = wasender_phone(phone)
 
         # Use the correct endpoint and payload structure
-        api_url = 'https://www.wasenderapi.com/api/send-message'
+        api_url = config['api_url']
         payload = {"to": clean_phone, "text": message}
         
         headers = {
@@ -175,91 +247,245 @@ def send_wasender_message(phone, message):
             'Accept': 'application/json'
         }
 
-        logger.info(f"📱 Sending via WasenderAPI to {clean_phone}")
-        logger.info(f"🔧 Using URL: {api_url}")
-        logger.info(f"🔧 Payload: {payload}")
+        logger.debug("📱 Sending via WasenderAPI to %s", clean_phone)
+        logger.debug("🔧 Using URL: %s", api_url)
+        logger.debug("🔧 Payload: %s", payload)
         
-        response = requests.post(api_url, json=payload, headers=headers, timeout=30)
-        logger.info(f"📊 Response status: {response.status_code}")
-        logger.info(f"📊 Response body: {response.text}")
+        response = provider_clients.session('wasender').post(
+            api_url, json=payload, headers=headers, timeout=provider_clients.timeout('wasender'))
+        logger.debug("📊 Response %s: %s", response.status_code, response.text)
 
         if response.status_code == 200:
             try:
                 result = response.json()
-                logger.info(f"✅ WasenderAPI message sent: {result}")
+                logger.info("✅ WasenderAPI message sent: %s", result, extra=sampled('send'))
+                data = result.get('data') if isinstance(result, dict) else None
+                status_writer.track('wasender', data.get('msgId') if isinstance(data, dict) else None, phone)
                 return True
             except json.JSONDecodeError:
                 # Check for success in plain text
                 if any(keyword in response.text.lower() for keyword in ['success', 'sent', 'delivered', 'queued']):
-                    logger.info("✅ WasenderAPI message sent (plain text response)")
+                    logger.info("✅ WasenderAPI message sent (plain text response)", extra=sampled('send'))
                     return True
                 else:
-                    logger.error(f"❌ Unexpected response format: {response.text}")
+                    logger.error("❌ Unexpected response format: %s", response.text)
                     return False
                     
         elif response.status_code == 422:
-            logger.error(f"❌ WasenderAPI validation error (422): {response.text}")
-            logger.error(f"❌ Phone format issue - tried: {clean_phone}")
-            return False
+            logger.error("❌ WasenderAPI validation error (422): %s", response.text)
+            logger.error("❌ Phone format issue - tried: %s", clean_phone)
+            return REJECTED
             
         elif response.status_code == 429:
-            try:
-                error_data = response.json()
-                retry_after = error_data.get('retry_after', 60)
-                logger.error(f"❌ WasenderAPI rate limited - retry after {retry_after} seconds")
-            except:
-                logger.error("❌ WasenderAPI rate limited - free trial: 1 message per minute")
-            return False
+            retry_after = parse_retry_after(response)
+            logger.error("❌ WasenderAPI rate limited - retry after %s seconds", retry_after)
+            rate_limiter.penalize('wasender', retry_after)
+            return THROTTLED
             
         elif response.status_code == 401:
             logger.error("❌ WasenderAPI unauthorized - check API key")
             return False
             
         else:
-            logger.error(f"❌ WasenderAPI HTTP error {response.status_code}: {response.text}")
-            return False
+            logger.error("❌ WasenderAPI HTTP error %s: %s", response.status_code, response.text)
+            return failed_send(response.status_code)
             
     except Exception as e:
-        logger.error(f"❌ WasenderAPI exception: {e}", exc_info=True)
+        logger.error("❌ WasenderAPI exception: %s", e, exc_info=True)
         return False
 
 def send_twilio_message(phone, message):
     try:
-        from twilio.rest import Client
+        from twilio.base.exceptions import TwilioRestException
+    except ImportError:
+        logger.error("❌ Twilio library not installed")
+        return False
+
+    try:
         config = PROVIDERS['twilio']
         if not all([config['account_sid'], config['api_key'], config['api_secret']]):
             logger.warning("⚠️ Twilio not configured")
             return False
 
-        client = Client(config['api_key'], config['api_secret'], config['account_sid'])
-        if not phone.startswith('+'):
-            phone = '+' + phone
-        to_whatsapp = f'whatsapp:{phone}'
+        client = provider_clients.twilio()
+        to_whatsapp = whatsapp_address(phone)
 
+        options = {'status_callback': config['status_callback']} if config['status_callback'] else {}
         message_obj = client.messages.create(
             body=message,
             from_=config['whatsapp_number'],
-            to=to_whatsapp
+            to=to_whatsapp,
+            **options
         )
-        logger.info(f"✅ Twilio message sent: SID = {message_obj.sid}")
+        metrics.record_response('twilio', 201)
+        status_writer.track('twilio', message_obj.sid, phone)
+        logger.info("✅ Twilio message sent: SID = %s", message_obj.sid, extra=sampled('send'))
         return True
+    except TwilioRestException as e:
+        metrics.record_response('twilio', e.status)
+        if e.status == 429:
+            rate_limiter.penalize('twilio', 60)
+        logger.error("❌ Twilio API error %s: %s", e.status, e.msg)
+        return failed_send(e.status)
     except Exception as e:
-        logger.error(f"❌ Twilio exception: {e}", exc_info=True)
+        logger.error("❌ Twilio exception: %s", e, exc_info=True)
         return False
 
+# ---------- Background dispatch ----------
+INVITE_MAX_RETRIES = int(os.getenv('INVITE_MAX_RETRIES', 3))
+# Minimum gap between retries; the rate limiter extends it when the provider asks for longer
+INVITE_RETRY_DELAY = int(os.getenv('INVITE_RETRY_DELAY', 5))
+
+def provider_configured(provider):
+    config = PROVIDERS.get(provider)
+    if provider == 'twilio':
+        return bool(config and config['account_sid'] and config['api_key'] and config['api_secret'])
+    return bool(config and config['api_key'])
+
+# Failover order; providers without credentials are left out
+ROUTED_PROVIDERS = [p.strip().lower() for p in os.getenv('WHATSAPP_PROVIDERS', WHATSAPP_PROVIDER).split(',')
+                    if p.strip()]
+ROUTED_PROVIDERS = [p for p in ROUTED_PROVIDERS if provider_configured(p)] or [WHATSAPP_PROVIDER]
+# Race a slow send against the next provider (threaded engine only); may deliver twice
+ROUTING_HEDGE_AFTER = float(os.getenv('ROUTING_HEDGE_AFTER', 0)) or None
+
+# Delivery receipts: accepted message ids and webhook updates, written in batches
+status_writer = StatusWriter(SessionFactory, flush_interval=float(os.getenv('STATUS_FLUSH_INTERVAL', 1.0)),
+                             max_batch=int(os.getenv('STATUS_FLUSH_BATCH', 500)))
+atexit.register(status_writer.stop)
+metrics.register_gauge('message_status_pending', 'Delivery updates waiting to be written', status_writer.pending)
+
+# "threads" uses the blocking senders above; "async" drives the asyncio engine
+SEND_ENGINE = os.getenv('SEND_ENGINE', 'threads').lower()
+async_sender = None
+
+def provider_send_func(provider):
+    if async_sender is not None:
+        return lambda phone, message: async_sender.submit(phone, message, provider).result()
+    return lambda phone, message: send_via_provider(provider, phone, message)
+
+provider_router = ProviderRouter(
+    ROUTED_PROVIDERS,
+    send_funcs={p: provider_send_func(p) for p in ROUTED_PROVIDERS},
+    # Also the dispatcher's retry hint, so it is needed even with one provider
+    rate_limiter=rate_limiter,
+    strategy=os.getenv('ROUTING_STRATEGY', 'priority').lower(),
+    max_wait=float(os.getenv('ROUTING_MAX_WAIT', 5)),
+    hedge_after=ROUTING_HEDGE_AFTER,
+    failure_threshold=int(os.getenv('ROUTING_FAILURE_THRESHOLD', 5)),
+    error_rate=float(os.getenv('ROUTING_ERROR_RATE', 0.5)),
+    window=int(os.getenv('ROUTING_WINDOW', 20)),
+    open_seconds=float(os.getenv('ROUTING_OPEN_SECONDS', 30)),
+)
+logger.info("🧭 Provider routing: %s", ' -> '.join(ROUTED_PROVIDERS))
+
+if SEND_ENGINE == 'async':
+    async_sender = AsyncSender(PROVIDERS, WHATSAPP_PROVIDER, rate_limiter=rate_limiter,
+                               max_in_flight=int(os.getenv('ASYNC_MAX_IN_FLIGHT', 200)),
+                               router=provider_router, on_accepted=status_writer.track)
+send_func = async_sender.send_blocking if async_sender else send_whatsapp_message
+
+CIRCUIT_STATE_VALUES = {'closed': 0, 'half_open': 1, 'open': 2}
+metrics.register_gauge('whatsapp_circuit_state', 'Provider circuit: 0 closed, 1 half-open, 2 open',
+                       lambda: {(name,): CIRCUIT_STATE_VALUES[state]
+                                for name, state in provider_router.states().items()}, ('provider',))
+
+dispatcher = DispatchQueue(SessionFactory, send_func, workers=int(os.getenv('DISPATCH_WORKERS', 4)),
+                           retry_hint=provider_router.wait_time)
+metrics.register_gauge('dispatch_queue_depth', 'Invite jobs queued or sending', dispatcher.depth)
+
+BULK_SEND_CONCURRENCY = int(os.getenv('BULK_SEND_CONCURRENCY', 8))
+BULK_SEND_MAX_CONCURRENCY = int(os.getenv('BULK_SEND_MAX_CONCURRENCY', 32))
+
+bulk_runner = BulkInviteRunner(SessionFactory, send_whatsapp_message, build_invite_message,
+                               commit_every=int(os.getenv('BULK_COMMIT_EVERY', 25)),
+                               async_sender=async_sender)
+
+# ---------- Startup ----------
+_database_ready = False
+startup_seconds = None
+
+def init_database():
+    """Create missing tables and counters (idempotent, once per process)"""
+    global _database_ready
+    if _database_ready:
+        return
+    storage.create_schema()
+    session = SessionFactory()
+    try:
+        ensure_counters(session, GUESTS_VERSION)
+    finally:
+        session.close()
+    _database_ready = True
+
+def create_app():
+    """Finish one-time startup and return the WSGI app.
+
+    Run by the production entry point (wsgi.py) in the server's master process
+    before it forks workers, so schema setup happens once. Background threads
+    and connections are still opened lazily, in each worker.
+    """
+    global startup_seconds
+    init_database()
+    logger.info("🔧 Environment check:")
+    logger.info("   WHATSAPP_PROVIDER = %s", WHATSAPP_PROVIDER)
+    logger.info("   WASENDER_API_KEY = %s", 'SET' if os.getenv('WASENDER_API_KEY') else 'NOT SET')
+    logger.info("   AUTHKEY_API_KEY = %s", 'SET' if os.getenv('AUTHKEY_API_KEY') else 'NOT SET')
+    if startup_seconds is None:
+        startup_seconds = time.perf_counter() - IMPORT_STARTED
+        logger.info("⏱️ App ready in %.0f ms (pid %s, %.1f MB resident)", startup_seconds * 1000,
+                    os.getpid(), metrics.resident_memory_bytes() / 1e6)
+    return app
+
+def after_fork():
+    """Reset process-local state inherited from the master in a new worker"""
+    restart_logging_after_fork()
+    storage.dispose(close=False)
+    provider_clients.reset()
+    guest_cache.clear()
+    metrics.REGISTRY.clear()
+    logger.info("👷 Worker %s forked (%.1f MB resident)", os.getpid(), metrics.resident_memory_bytes() / 1e6)
+
+metrics.register_gauge('app_startup_seconds', 'Import-to-ready time of the app in the master process',
+                       lambda: startup_seconds or 0.0)
+
+@app.before_request
+def start_dispatcher():
+    # Started lazily so the dev-server reloader parent and a prefork master never run workers
+    init_database()
+    dispatcher.start()
+    status_writer.start()
+
 # ---------- Routes ----------
+PAGES = ('index.html', 'admin.html', 'main.html')
+static_files = StaticFiles(app.root_path)
+static_files.preload('.', *PAGES)
+
 @app.route("/")
 def index():
-    return send_from_directory('.', 'index.html')
+    return static_files.serve('.', 'index.html')
 
 @app.route("/admin")
 @app.route("/admin.html")
 def admin_html():
-    return send_from_directory('.', 'admin.html')
+    return static_files.serve('.', 'admin.html')
 
 @app.route("/main.html")
 def main():
-    return send_from_directory('.', 'main.html')
+    return static_files.serve('.', 'main.html')
+
+ASSETS_DIR = 'assets'
+BUILD_PREFIX = 'build/'
+
+@app.route("/assets/<path:filename>")
+def assets(filename):
+    """Gallery sources, the song, and the content-hashed outputs of build_assets.py"""
+    if filename.startswith(BUILD_PREFIX) and not filename.endswith('manifest.json'):
+        # Build outputs are named by content hash, so they never change
+        return static_files.serve(ASSETS_DIR, filename, cache_control=IMMUTABLE)
+    if filename.endswith('.json'):
+        return static_files.serve(ASSETS_DIR, filename)
+    return static_files.serve(ASSETS_DIR, filename, cache_control=DAILY)
 
 @app.route("/api/add_guest", methods=["POST"])
 def add_guest():
@@ -268,12 +494,16 @@ def add_guest():
 
     name = data.get("name")
     phone = normalize_phone(data.get("phone"))
-    logger.info(f"🆕 Adding guest: {name} - {phone}")
+    logger.info("🆕 Adding guest: %s - %s", name, phone)
 
     if not name or not phone:
         session.close()
         return jsonify({"error": "Name and phone are required"}), 400
 
+    if not is_valid_phone(phone):
+        session.close()
+        return jsonify({"error": f"Invalid phone number: {data.get('phone')}"}), 400
+
     if session.query(Guest).filter_by(phone=phone).first():
         session.close()
         return jsonify({"error": "Guest already exists"}), 409
@@ -281,14 +511,75 @@ def add_guest():
     password = generate_password()
     guest = Guest(name=name, phone=phone, password=password)
     session.add(guest)
+    session.flush()
+    record_guest_changes(session, 'added', [guest.id])
     session.commit()
     session.close()
+    guest_cache.invalidate(phone)
 
-    logger.info(f"✅ Guest added: {name} - Password: {password}")
+    logger.info("✅ Guest added: %s", name)
     return jsonify({"message": f"Guest {name} added successfully", "password": password, "phone": phone})
 
+guest_importer = GuestImporter(SessionFactory, batch_size=int(os.getenv('IMPORT_BATCH_SIZE', 500)))
+
+gallery_manifest = GalleryManifest(os.path.join(app.root_path, ASSETS_DIR),
+                                   rescan_interval=float(os.getenv('GALLERY_RESCAN_SECONDS', 10)))
+
+@app.route("/api/gallery", methods=["GET"])
+def gallery():
+    """Photo list with dimensions, variant URLs and inline placeholders"""
+    manifest = gallery_manifest.get()
+    if manifest["version"] in request.if_none_match:
+        response = make_response("", 304)
+    else:
+        response = jsonify(manifest)
+    response.set_etag(manifest["version"])
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def import_message(summary):
+    return f"Imported {summary['added']} guests ({summary['duplicate']} duplicates, {summary['invalid']} invalid)"
+
+@app.route("/api/import_guests", methods=["POST"])
+def import_guests():
+    """Import guests from an uploaded or streamed CSV (name,phone header) or JSON list"""
+    upload = request.files.get("file")
+    if upload:
+        stream, filename, content_type = upload.stream, upload.filename or "", upload.mimetype
+    else:
+        stream, filename, content_type = request.stream, "", request.mimetype
+
+    fmt = request.args.get("format")
+    if not fmt:
+        is_json = content_type == "application/json" or filename.lower().endswith(".json")
+        fmt = "json" if is_json else "csv"
+    if fmt not in ("csv", "json"):
+        return jsonify({"error": "format must be csv or json"}), 400
+
+    try:
+        rows = load_json_rows(stream) if fmt == "json" else iter_csv_rows(stream)
+        summary, report = guest_importer.run(rows)
+    except ImportInterrupted as e:
+        # Rows before the unreadable part were imported; say which
+        return jsonify({
+            "error": f"Could not read {fmt.upper()} import after row {e.summary['total']}: {e}",
+            "message": import_message(e.summary),
+            "summary": e.summary,
+            "rows": e.report
+        }), 400
+    except (ValueError, csv.Error) as e:
+        logger.error("❌ Guest import failed: %s", e)
+        return jsonify({"error": f"Could not read {fmt.upper()} import: {e}"}), 400
+
+    return jsonify({
+        "message": import_message(summary),
+        "summary": summary,
+        "rows": report
+    })
+
 @app.route("/api/send_invite/<int:guest_id>", methods=["POST"])
 def send_invite(guest_id):
+    """Queue an invite for background delivery and return the job id"""
     session = Session()
     guest = session.get(Guest, guest_id)
 
@@ -296,53 +587,18 @@ def send_invite(guest_id):
         session.close()
         return jsonify({"error": "Guest not found"}), 404
 
-    # Store guest details before potential session closure
     guest_name = guest.name
     guest_phone = guest.phone
-    guest_password = guest.password
-    
-    logger.info(f"📧 Sending invite to {guest_name} ({guest_phone}) via {WHATSAPP_PROVIDER}")
-
-    message = f"""🌟 You're invited to the best wedding this galaxy has ever experienced! 🚀
-
-Hi {guest_name}! 💍
-
-You're cordially invited to join us for our special day.
-
-📱 RSVP: {LOGIN_LINK}
-📱 Username: Your cell number
-🔐 Your password: {guest_password}
-
-📅 Date: Sunday, September 28th, 2025
-📍 Venue: Carmel Coastal Retreat
-🕐 Time: 12:00 PM - Midday
-
-Can't wait to celebrate with you! ✨
-
-Love,
-The Happy Couple 💕"""
-
-    try:
-        success = send_whatsapp_message(guest_phone, message)
-    except Exception as e:
-        logger.error(f"❌ Exception while sending invite: {e}", exc_info=True)
-        session.close()
-        return jsonify({"error": "Internal server error while sending invite"}), 500
+    message = build_invite_message(guest_name, guest.password)
+    session.close()
 
-    if success:
-        guest.invite_sent = True
-        session.commit()
-        session.close()
-        logger.info(f"✅ Invitation sent to {guest_name}")
-        return jsonify({"message": f"Invitation sent to {guest_name} via {WHATSAPP_PROVIDER}"})
-    else:
-        session.close()
-        logger.error(f"❌ Failed to send invitation to {guest_name}")
-        return jsonify({"error": f"Failed to send WhatsApp message via {WHATSAPP_PROVIDER}"}), 500
+    job_id = dispatcher.enqueue(guest_phone, message, guest_id=guest_id)
+    logger.info("📧 Queued invite for %s (%s) via %s - job %s", guest_name, guest_phone, WHATSAPP_PROVIDER, job_id)
+    return jsonify({"message": f"Invitation to {guest_name} queued via {WHATSAPP_PROVIDER}", "job_id": job_id}), 202
 
 @app.route("/api/send_invite_with_delay/<int:guest_id>", methods=["POST"])
 def send_invite_with_delay(guest_id):
-    """Send invite with automatic delay handling for free trial rate limits"""
+    """Queue an invite that is retried in the background for free trial rate limits"""
     session = Session()
     guest = session.get(Guest, guest_id)
 
@@ -350,125 +606,503 @@ def send_invite_with_delay(guest_id):
         session.close()
         return jsonify({"error": "Guest not found"}), 404
 
-    # Store guest details before potential session closure
     guest_name = guest.name
     guest_phone = guest.phone
-    guest_password = guest.password
-    
-    logger.info(f"📧 Sending invite to {guest_name} ({guest_phone}) via {WHATSAPP_PROVIDER}")
+    message = build_invite_message(guest_name, guest.password)
+    session.close()
 
-    message = f"""🌟 You're invited to the best wedding this galaxy has ever experienced! 🚀
+    job_id = dispatcher.enqueue(guest_phone, message, guest_id=guest_id,
+                                max_attempts=INVITE_MAX_RETRIES, retry_delay=INVITE_RETRY_DELAY)
+    logger.info("📧 Queued invite with retries for %s (%s) - job %s", guest_name, guest_phone, job_id)
+    return jsonify({"message": f"Invitation to {guest_name} queued via {WHATSAPP_PROVIDER}", "job_id": job_id}), 202
+
+@app.route("/api/jobs/<int:job_id>", methods=["GET"])
+def get_job(job_id):
+    """Poll the status of a queued message"""
+    job = dispatcher.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route("/api/send_invites", methods=["POST"])
+def send_invites():
+    """Send invites to a list of guest ids or every guest matching a filter"""
+    data = request.get_json(silent=True) or {}
+    guest_ids = data.get("guest_ids")
+    filters = data.get("filter")
+
+    if guest_ids is None and filters is None:
+        return jsonify({"error": "Provide guest_ids or a filter"}), 400
 
-Hi {guest_name}! 💍
+    try:
+        concurrency = int(data.get("concurrency", BULK_SEND_CONCURRENCY))
+    except (TypeError, ValueError):
+        return jsonify({"error": "concurrency must be an integer"}), 400
+    concurrency = max(1, min(concurrency, BULK_SEND_MAX_CONCURRENCY))
+
+    if filters is not None:
+        if not isinstance(filters, dict):
+            return jsonify({"error": "filter must be an object, e.g. {\"invite_sent\": false}"}), 400
+        unknown = set(filters) - {"invite_sent", "rsvp_status"}
+        if unknown:
+            return jsonify({"error": f"Unknown filter keys: {', '.join(sorted(unknown))}"}), 400
+        invite_sent = filters.get("invite_sent")
+        if invite_sent is not None and not isinstance(invite_sent, bool):
+            try:
+                invite_sent = parse_bool(str(invite_sent))
+            except ValueError as e:
+                return jsonify({"error": f"filter.invite_sent: {e}"}), 400
+        if "rsvp_status" in filters and not isinstance(filters["rsvp_status"], str):
+            return jsonify({"error": "filter.rsvp_status must be a string"}), 400
 
-You're cordially invited to join us for our special day.
+    session = Session()
+    query = session.query(Guest.id, Guest.name, Guest.phone, Guest.password)
+    if guest_ids is not None:
+        if not isinstance(guest_ids, list) or not all(isinstance(i, int) for i in guest_ids):
+            session.close()
+            return jsonify({"error": "guest_ids must be a list of integers"}), 400
+        query = query.filter(Guest.id.in_(guest_ids))
+    if filters:
+        if invite_sent is not None:
+            query = query.filter(Guest.invite_sent == invite_sent)
+        if "rsvp_status" in filters:
+            query = query.filter(Guest.rsvp_status == filters["rsvp_status"])
+    guests = [tuple(row) for row in query.order_by(Guest.id).all()]
+    session.close()
 
-📱 RSVP: {LOGIN_LINK}
-📱 Username: Your cell number
-🔐 Your password: {guest_password}
+    batch_id = bulk_runner.start(guests, concurrency)
+    logger.info("📨 Bulk invite batch %s queued for %s guests", batch_id, len(guests))
+    return jsonify({"message": f"Sending {len(guests)} invites via {WHATSAPP_PROVIDER}",
+                    "batch_id": batch_id, "total": len(guests)}), 202
+
+@app.route("/api/send_invites/<int:batch_id>", methods=["GET"])
+def send_invites_progress(batch_id):
+    """Poll the progress of a bulk invite run"""
+    batch = bulk_runner.get(batch_id)
+    if not batch:
+        return jsonify({"error": "Batch not found"}), 404
+    return jsonify(batch)
+
+GUEST_FIELDS = ("id", "name", "phone", "password", "invite_sent", "rsvp_status")
+GUESTS_PAGE_MAX = int(os.getenv('GUESTS_PAGE_MAX', 500))
+
+def parse_bool(value):
+    if value is None:
+        return None
+    lowered = value.strip().lower()
+    if lowered in ("1", "true", "yes"):
+        return True
+    if lowered in ("0", "false", "no"):
+        return False
+    raise ValueError(f"Invalid boolean: {value}")
+
+def apply_guest_filters(query, args):
+    """Apply the rsvp_status, invite_sent and q (name/phone search) query filters"""
+    rsvp_status = args.get("rsvp_status")
+    if rsvp_status:
+        query = query.filter(Guest.rsvp_status == rsvp_status)
+
+    invite_sent = parse_bool(args.get("invite_sent"))
+    if invite_sent is not None:
+        query = query.filter(Guest.invite_sent == invite_sent)
+
+    search = (args.get("q") or "").strip()
+    if search:
+        pattern = f"%{search}%"
+        query = query.filter(or_(Guest.name.ilike(pattern), Guest.phone.like(pattern)))
+    return query
+
+def parse_guest_fields(args):
+    fields = args.get("fields")
+    if not fields:
+        return GUEST_FIELDS
+    requested = tuple(f.strip() for f in fields.split(",") if f.strip())
+    unknown = [f for f in requested if f not in GUEST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return requested
 
-📅 Date: Sunday, September 28th, 2025
-📍 Venue: Carmel Coastal Retreat
-🕐 Time: 12:00 PM - Midday
+@app.route("/api/guests", methods=["GET"])
+def get_guests():
+    """List guests with optional filters, field projection and cursor pagination.
 
-Can't wait to celebrate with you! ✨
+    Without ``limit``/``cursor`` the full list is returned as a JSON array.
+    """
+    session = Session()
+    version = read_counter(session, GUESTS_VERSION)
+    # Read before the rows: changes after it may already be in the body, and replaying them is harmless
+    change_version = latest_version(session)
+    # The version changes on every guest write, so it plus the query identifies the body
+    etag = hashlib.sha1(f"{version}?{request.query_string.decode()}".encode()).hexdigest()
+    if etag in request.if_none_match:
+        session.close()
+        response = make_response("", 304)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Change-Version"] = str(change_version)
+        return response
 
-Love,
-The Happy Couple 💕"""
+    try:
+        fields = parse_guest_fields(request.args)
+        paginated = "limit" in request.args or "cursor" in request.args
+        limit = max(1, min(int(request.args.get("limit", GUESTS_PAGE_MAX)), GUESTS_PAGE_MAX))
+        cursor = int(request.args["cursor"]) if request.args.get("cursor") else None
+        query = apply_guest_filters(session.query(*(getattr(Guest, f) for f in fields), Guest.id), request.args)
+    except ValueError as e:
+        session.close()
+        return jsonify({"error": str(e)}), 400
 
-    max_retries = 3
-    retry_count = 0
-    
-    while retry_count < max_retries:
-        try:
-            success = send_whatsapp_message(guest_phone, message)
-            
-            if success:
-                guest.invite_sent = True
-                session.commit()
-                session.close()
-                logger.info(f"✅ Invitation sent to {guest_name}")
-                return jsonify({"message": f"Invitation sent to {guest_name} via {WHATSAPP_PROVIDER}"})
-            else:
-                retry_count += 1
-                if retry_count < max_retries:
-                    logger.info(f"⏳ Retrying in 65 seconds (attempt {retry_count + 1}/{max_retries})...")
-                    time.sleep(65)  # Wait just over 1 minute for rate limit reset
-                    continue
-                    
-        except Exception as e:
-            logger.error(f"❌ Exception while sending invite: {e}", exc_info=True)
-            break
-    
+    query = query.order_by(Guest.id)
+    if cursor is not None:
+        query = query.filter(Guest.id > cursor)
+    if paginated:
+        query = query.limit(limit + 1)
+
+    rows = query.all()
     session.close()
-    return jsonify({"error": f"Failed to send invitation after {max_retries} attempts"}), 500
 
-@app.route("/api/guests", methods=["GET"])
-def get_guests():
+    next_cursor = None
+    if paginated and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1][-1]
+
+    data = [dict(zip(fields, row)) for row in rows]
+    logger.debug("📋 Retrieved %s guests", len(data))
+    response = jsonify({"guests": data, "next_cursor": next_cursor} if paginated else data)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Change-Version"] = str(change_version)
+    return response
+
+change_feed = ChangeFeed(SessionFactory, GUEST_FIELDS,
+                         poll_interval=float(os.getenv('CHANGE_FEED_POLL_MS', 500)) / 1000,
+                         retention=int(os.getenv('CHANGE_FEED_RETENTION', 10000)),
+                         max_streams=int(os.getenv('CHANGE_FEED_MAX_STREAMS', 2)))
+metrics.register_gauge('change_feed_subscribers', 'Admin change streams open on this worker',
+                       change_feed.subscribers)
+
+def parse_since(args, headers=None):
+    since = (headers or {}).get("Last-Event-ID") or args.get("since", "0")
+    value = int(since)
+    if value < 0:
+        raise ValueError("since must be >= 0")
+    return value
+
+@app.route("/api/guests/changes", methods=["GET"])
+def guest_changes():
+    """Guests added, changed or deleted after ``since`` (the X-Change-Version of /api/guests)"""
+    try:
+        since = parse_since(request.args)
+    except ValueError:
+        return jsonify({"error": "since must be a non-negative integer"}), 400
+    return jsonify(change_feed.delta(since))
+
+@app.route("/api/guests/stream", methods=["GET"])
+def guest_change_stream():
+    """Server-Sent Events: a ``changes`` event with a delta whenever the guest list moves
+
+    Each open stream holds a worker thread, so at most CHANGE_FEED_MAX_STREAMS
+    run per worker; past that clients get 503 and poll /api/guests/changes.
+    """
+    try:
+        since = parse_since(request.args, request.headers)
+    except ValueError:
+        return jsonify({"error": "since must be a non-negative integer"}), 400
+    subscriber = change_feed.subscribe()
+    if subscriber is None:
+        logger.warning("⚠️ Change stream refused: %s already open on worker %s",
+                       change_feed.max_streams, os.getpid())
+        error = jsonify({"error": "Too many live streams, poll /api/guests/changes instead"})
+        return error, 503, {"Retry-After": "60"}
+    response = Response(change_feed.stream(since, subscriber), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Also release the slot if the client goes away before the stream starts
+    response.call_on_close(lambda: change_feed.unsubscribe(subscriber))
+    return response
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 1000))
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def export_rows(session, query, fields, fmt):
+    """Yield the export body one chunk of rows at a time"""
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        if writer:
+            writer.writerow(fields)
+        pending = 0
+        # yield_per streams from a server-side cursor where the driver has one
+        for row in query.yield_per(EXPORT_CHUNK_SIZE):
+            if writer:
+                writer.writerow(row[:len(fields)])
+            else:
+                buffer.write(json.dumps(dict(zip(fields, row))) + "\n")
+            pending += 1
+            if pending >= EXPORT_CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        yield buffer.getvalue()
+    finally:
+        session.close()
+
+@app.route("/api/export_guests", methods=["GET"])
+def export_guests():
+    """Stream guests as CSV (default) or NDJSON; takes the same filters and fields as /api/guests"""
+    fmt = request.args.get("format", "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unknown format: {fmt} (use csv or ndjson)"}), 400
+
+    # Own session: the body is produced after this view returns and the request session is gone
+    session = SessionFactory()
+    try:
+        fields = parse_guest_fields(request.args)
+        query = apply_guest_filters(session.query(*(getattr(Guest, f) for f in fields), Guest.id), request.args)
+    except ValueError as e:
+        session.close()
+        return jsonify({"error": str(e)}), 400
+
+    filename = f"guests-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+    logger.info("📤 Exporting guests as %s", fmt)
+    return Response(export_rows(session, query.order_by(Guest.id), fields, fmt), mimetype=EXPORT_FORMATS[fmt],
+                    headers={"Content-Disposition": f"attachment; filename={filename}",
+                             "Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
+_guest_stats = None  # (guests_version, totals) of the last GROUP BY
+
+def guest_stats(session, version):
+    """RSVP and invite totals from one GROUP BY, recomputed only when the guests version moves"""
+    global _guest_stats
+    cached = _guest_stats
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    rows = session.query(Guest.rsvp_status, Guest.invite_sent, func.count(Guest.id)).group_by(
+        Guest.rsvp_status, Guest.invite_sent)
+    stats = {"total": 0, "accepted": 0, "declined": 0, "pending": 0, "invited": 0, "not_invited": 0}
+    for rsvp_status, invite_sent, count in rows:
+        stats["total"] += count
+        stats[rsvp_status if rsvp_status in ("accepted", "declined") else "pending"] += count
+        stats["invited" if invite_sent else "not_invited"] += count
+    _guest_stats = (version, stats)
+    return stats
+
+@app.route("/api/stats", methods=["GET"])
+def get_stats():
+    """Dashboard totals without shipping the guest list"""
     session = Session()
-    guests = session.query(Guest).all()
-    data = [{
-        "id": g.id,
-        "name": g.name,
-        "phone": g.phone,
-        "password": g.password,
-        "invite_sent": g.invite_sent,
-        "rsvp_status": g.rsvp_status
-    } for g in guests]
+    version = read_counter(session, GUESTS_VERSION)
+    etag = f"stats-{version}"
+    if etag in request.if_none_match:
+        session.close()
+        response = make_response("", 304)
+    else:
+        stats = guest_stats(session, version)
+        session.close()
+        response = jsonify({**stats, "version": version})
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+guest_cache = GuestCache(maxsize=int(os.getenv('GUEST_CACHE_SIZE', 2048)),
+                         ttl=float(os.getenv('GUEST_CACHE_TTL', 60)))
+
+def lookup_guest(phone):
+    """Guest record for a normalised phone, served from the cache when possible"""
+    record = guest_cache.get(phone)
+    if record is not None:
+        return record
+
+    session = Session()
+    guest = session.query(Guest).filter_by(phone=phone).first()
+    if guest:
+        record = {
+            "id": guest.id,
+            "name": guest.name,
+            "phone": guest.phone,
+            "password": guest.password,
+            "rsvp_status": guest.rsvp_status
+        }
     session.close()
-    logger.info(f"📋 Retrieved {len(data)} guests")
-    return jsonify(data)
+
+    if record is not None:
+        guest_cache.put(phone, record)
+    return record
+
+# Signed guest sessions issued by /api/login and checked in memory by guest endpoints
+token_signer = signer_from_env()
+# Reject the legacy phone-only RSVP once every open page has a token
+RSVP_REQUIRE_TOKEN = parse_bool(os.getenv('RSVP_REQUIRE_TOKEN', '0'))
 
 @app.route("/api/login", methods=["POST"])
 def login():
     data = request.get_json()
     phone = normalize_phone(data.get("phone"))
     password = data.get("password")
-    logger.info(f"🔐 Login attempt: {phone}")
+    logger.debug("🔐 Login attempt: %s", phone)
 
     if not phone or not password:
         return jsonify({"success": False, "error": "Phone and password required"}), 400
 
-    session = Session()
-    guest = session.query(Guest).filter_by(phone=phone, password=password).first()
-    session.close()
+    guest = lookup_guest(phone)
 
-    if guest:
-        logger.info(f"✅ Login successful: {guest.name}")
-        return jsonify({"success": True, "guest": {
-            "name": guest.name,
-            "phone": guest.phone,
-            "rsvp_status": guest.rsvp_status
+    if guest and hmac.compare_digest(guest["password"], str(password)):
+        logger.info("✅ Login successful: %s", guest['name'], extra=sampled('login'))
+        token, expires_at = token_signer.issue(guest["id"], guest["phone"])
+        return jsonify({"success": True, "token": token, "expires_at": expires_at, "guest": {
+            "name": guest["name"],
+            "phone": guest["phone"],
+            "rsvp_status": guest["rsvp_status"]
         }})
-    logger.warning(f"❌ Login failed: {phone}")
+    logger.warning("❌ Login failed: %s", phone)
     return jsonify({"success": False, "error": "Invalid credentials"}), 401
 
+# Optional group commit: RSVPs arriving within the window share one transaction
+RSVP_COMMIT_TIMEOUT = float(os.getenv('RSVP_COMMIT_TIMEOUT', 10))
+rsvp_writer = None
+if parse_bool(os.getenv('RSVP_GROUP_COMMIT', '0')):
+    rsvp_writer = RsvpWriter(SessionFactory, window=float(os.getenv('RSVP_GROUP_COMMIT_WINDOW_MS', 5)) / 1000.0,
+                             max_batch=int(os.getenv('RSVP_GROUP_COMMIT_MAX_BATCH', 256)))
+
 @app.route("/api/rsvp", methods=["POST"])
 def rsvp():
-    data = request.get_json()
-    phone = normalize_phone(data.get("phone"))
+    data = request.get_json(silent=True) or {}
     status = data.get("status")
-
-    if not phone or status not in ['accepted', 'declined']:
+    if status not in ['accepted', 'declined']:
         return jsonify({"success": False, "error": "Invalid data"}), 400
 
-    session = Session()
-    guest = session.query(Guest).filter_by(phone=phone).first()
-
-    if not guest:
+    token = bearer_token(request)
+    if token:
+        # Signed session: guest id and phone come from the token, no lookup needed
+        claims = token_signer.verify(token)
+        if not claims:
+            return jsonify({"success": False, "error": "Session expired, please log in again"}), 401
+        guest_id, phone, guest_label = claims["guest_id"], claims["phone"], claims["phone"]
+    elif RSVP_REQUIRE_TOKEN:
+        return jsonify({"success": False, "error": "Please log in to RSVP"}), 401
+    else:
+        phone = normalize_phone(data.get("phone"))
+        guest = lookup_guest(phone) if phone else None
+        if not guest:
+            return jsonify({"success": False, "error": "Guest not found"}), 404
+        guest_id, guest_label = guest["id"], guest["name"]
+
+    if rsvp_writer is not None:
+        # Answered only after the batched transaction holding this update commits
+        try:
+            updated = rsvp_writer.submit(guest_id, status, phone).result(timeout=RSVP_COMMIT_TIMEOUT)
+        except Exception as e:
+            logger.error("❌ RSVP for %s not committed: %s", guest_label, e)
+            return jsonify({"success": False, "error": "Could not save RSVP, please try again"}), 503
+    else:
+        session = Session()
+        # The phone guards against ids reused after a delete handing an old token someone else's row
+        result = session.execute(update(Guest).where(Guest.id == guest_id, Guest.phone == phone)
+                                 .values(rsvp_status=status))
+        updated = result.rowcount > 0
+        if updated:
+            record_guest_changes(session, 'rsvp', [guest_id])
+            session.commit()
         session.close()
+
+    guest_cache.invalidate(phone)
+    if not updated:
+        if token:
+            # The guest behind this token is gone (or its id now belongs to someone else)
+            return jsonify({"success": False, "error": "Session expired, please log in again"}), 401
+        # Deleted by another process since it was cached
         return jsonify({"success": False, "error": "Guest not found"}), 404
 
-    guest.rsvp_status = status
-    session.commit()
+    logger.info("✅ RSVP updated: %s - %s", guest_label, status)
+    return jsonify({"success": True, "message": f"RSVP updated to {status}"})
+
+metrics.register_gauge('guest_cache_entries', 'Guest lookups currently cached',
+                       lambda: guest_cache.stats()["size"])
+metrics.register_counter('guest_cache_lookups_total', 'Guest cache lookups by result',
+                         lambda: {("hit",): guest_cache.hits, ("miss",): guest_cache.misses}, ('result',))
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus scrape target"""
+    return metrics.REGISTRY.render(), 200, {"Content-Type": metrics.CONTENT_TYPE}
+
+@app.route("/api/cache_stats", methods=["GET"])
+def cache_stats():
+    """Guest lookup cache hit/miss counters"""
+    return jsonify(guest_cache.stats())
+
+@app.route("/api/webhooks/twilio", methods=["POST"])
+def twilio_status_webhook():
+    """Twilio message status callback (queued/sent/delivered/read/failed/undelivered)"""
+    auth_token = os.getenv('TWILIO_AUTH_TOKEN')
+    if auth_token:
+        from twilio.request_validator import RequestValidator
+        # Twilio signs the public URL it posted to; behind a TLS-terminating proxy
+        # request.url is the internal http:// one, so prefer the configured callback
+        url = PROVIDERS['twilio']['status_callback'] or request.url
+        if not RequestValidator(auth_token).validate(url, request.form.to_dict(),
+                                                     request.headers.get('X-Twilio-Signature', '')):
+            return jsonify({"error": "Invalid signature"}), 403
+
+    message_id, status, phone, error_code = twilio_event(request.form)
+    if not message_id or not status_writer.record('twilio', message_id, status, phone, error_code):
+        return jsonify({"error": "Unrecognised status callback"}), 400
+    return "", 204
+
+@app.route("/api/webhooks/wasender", methods=["POST"])
+def wasender_status_webhook():
+    """WasenderAPI message events (messages.update, message.sent, ...)"""
+    secret = os.getenv('WASENDER_WEBHOOK_SECRET')
+    if secret and not hmac.compare_digest(request.headers.get('X-Webhook-Signature', ''), secret):
+        return jsonify({"error": "Invalid signature"}), 403
+
+    recorded = 0
+    for message_id, status, phone, error_code in wasender_events(request.get_json(silent=True)):
+        recorded += status_writer.record('wasender', message_id, status, phone, error_code)
+    # Events we don't track are acknowledged too, so the provider doesn't retry them
+    return jsonify({"received": recorded}), 200
+
+@app.route("/api/delivery_status", methods=["GET"])
+def delivery_status():
+    """Furthest delivery status per guest, optionally limited to ?guest_ids=1,2,3"""
+    guest_ids = None
+    if request.args.get("guest_ids"):
+        try:
+            guest_ids = [int(i) for i in request.args["guest_ids"].split(",") if i.strip()]
+        except ValueError:
+            return jsonify({"error": "guest_ids must be a comma-separated list of integers"}), 400
+    session = Session()
+    statuses = latest_status_by_guest(session, guest_ids)
     session.close()
+    return jsonify({str(guest_id): status for guest_id, status in statuses.items()})
 
-    logger.info(f"✅ RSVP updated: {guest.name} - {status}")
-    return jsonify({"success": True, "message": f"RSVP updated to {status}"})
+@app.route("/api/guests/<int:guest_id>/messages", methods=["GET"])
+def guest_messages(guest_id):
+    """Every tracked message to one guest with its delivery timeline"""
+    session = Session()
+    rows = session.query(MessageStatus).filter(MessageStatus.guest_id == guest_id).order_by(
+        MessageStatus.created_at.desc()).all()
+    data = [{
+        "provider": row.provider,
+        "message_id": row.message_id,
+        "status": row.status,
+        "error_code": row.error_code,
+        "sent_at": row.created_at.isoformat(),
+        "delivered_at": row.delivered_at.isoformat() if row.delivered_at else None,
+        "read_at": row.read_at.isoformat() if row.read_at else None,
+    } for row in rows]
+    session.close()
+    return jsonify(data)
+
+@app.route("/api/providers", methods=["GET"])
+def providers_health():
+    """Failover order plus each provider's circuit state, error rate and latency"""
+    return jsonify({"order": ROUTED_PROVIDERS, "providers": provider_router.snapshot()})
 
 @app.route("/api/test_whatsapp", methods=["GET"])
 def test_whatsapp():
-    logger.info(f"🧪 Testing {WHATSAPP_PROVIDER} configuration...")
+    logger.info("🧪 Testing %s configuration...", WHATSAPP_PROVIDER)
     config = PROVIDERS.get(WHATSAPP_PROVIDER, {})
 
     if WHATSAPP_PROVIDER == 'authkey':
@@ -494,7 +1128,7 @@ def test_whatsapp():
 @app.route("/api/test_whatsapp_detailed", methods=["GET"])
 def test_whatsapp_detailed():
     """Enhanced diagnostic endpoint for WasenderAPI"""
-    logger.info(f"🧪 Detailed testing {WHATSAPP_PROVIDER} configuration...")
+    logger.info("🧪 Detailed testing %s configuration...", WHATSAPP_PROVIDER)
     
     if WHATSAPP_PROVIDER != 'wasender':
         return jsonify({"error": "This detailed test is for WasenderAPI only"})
@@ -576,9 +1210,11 @@ def test_send():
         return jsonify({"error": "Phone number required"}), 400
     
     phone = normalize_phone(phone)
+    if not is_valid_phone(phone):
+        return jsonify({"error": "Invalid phone number"}), 400
     test_message = "🧪 Test message from wedding invitation system. If you receive this, the system is working!"
     
-    logger.info(f"🧪 Sending test message to {phone}")
+    logger.info("🧪 Sending test message to %s", phone)
     success = send_whatsapp_message(phone, test_message)
     
     if success:
@@ -597,11 +1233,14 @@ def delete_guest(guest_id):
         return jsonify({"error": "Guest not found"}), 404
     
     guest_name = guest.name
+    guest_phone = guest.phone
     session.delete(guest)
+    record_guest_changes(session, 'deleted', [guest_id])
     session.commit()
     session.close()
+    guest_cache.invalidate(guest_phone)
     
-    logger.info(f"🗑️ Deleted guest: {guest_name} (ID: {guest_id})")
+    logger.info("🗑️ Deleted guest: %s (ID: %s)", guest_name, guest_id)
     return jsonify({"message": f"Guest {guest_name} deleted successfully"})
 
 @app.route("/api/delete_all_guests", methods=["DELETE"])
@@ -615,63 +1254,88 @@ def delete_all_guests():
         return jsonify({"message": "No guests to delete"})
     
     session.query(Guest).delete()
+    record_guest_changes(session, 'cleared')
     session.commit()
     session.close()
+    guest_cache.clear()
     
-    logger.info(f"🗑️ Deleted ALL {guest_count} guests from database")
+    logger.info("🗑️ Deleted ALL %s guests from database", guest_count)
     return jsonify({"message": f"Successfully deleted all {guest_count} guests"})
 
+def env_list(name, default):
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+TEST_GUEST_NAME_PATTERNS = env_list('TEST_GUEST_NAME_PATTERNS', 'test,demo,example,dummy,sample,fake')
+TEST_GUEST_PHONE_PATTERNS = env_list('TEST_GUEST_PHONE_PATTERNS', '1234567,0000000,1111111,9999999')
+PURGE_CHUNK_SIZE = 500
+
+def parse_patterns(data, key, default):
+    """A list of non-empty strings from the body; an empty pattern would match every guest"""
+    patterns = data.get(key, default)
+    if not isinstance(patterns, list) or not all(isinstance(p, str) and p.strip() for p in patterns):
+        raise ValueError(f"{key} must be a list of non-empty strings")
+    return [p.strip() for p in patterns]
+
 @app.route("/api/delete_test_guests", methods=["DELETE"])
 def delete_test_guests():
-    """Delete guests that look like test users"""
+    """Delete guests that look like test users (?dry_run=1 previews without deleting)"""
+    data = request.get_json(silent=True) or {}
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("Body must be a JSON object")
+        name_patterns = parse_patterns(data, "name_patterns", TEST_GUEST_NAME_PATTERNS)
+        phone_patterns = parse_patterns(data, "phone_patterns", TEST_GUEST_PHONE_PATTERNS)
+        dry_run = bool(parse_bool(request.args.get("dry_run")))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # One case-insensitive pass over the table for every pattern
+    conditions = [func.lower(Guest.name).contains(p.lower(), autoescape=True) for p in name_patterns]
+    conditions += [Guest.phone.contains(p, autoescape=True) for p in phone_patterns]
+    if not conditions:
+        return jsonify({"message": "No test patterns configured", "deleted_guests": [], "dry_run": dry_run})
+
     session = Session()
-    
-    # Define patterns that indicate test users
-    test_patterns = [
-        'test', 'Test', 'TEST',
-        'demo', 'Demo', 'DEMO',
-        'example', 'Example', 'EXAMPLE',
-        'dummy', 'Dummy', 'DUMMY',
-        'sample', 'Sample', 'SAMPLE',
-        'fake', 'Fake', 'FAKE'
-    ]
-    
-    deleted_guests = []
-    
-    # Find guests with test-like names
-    for pattern in test_patterns:
-        test_guests = session.query(Guest).filter(Guest.name.contains(pattern)).all()
-        for guest in test_guests:
-            deleted_guests.append({"name": guest.name, "phone": guest.phone})
-            session.delete(guest)
-    
-    # Also delete guests with obvious test phone numbers
-    test_phone_patterns = ['1234567', '0000000', '1111111', '9999999']
-    for pattern in test_phone_patterns:
-        test_guests = session.query(Guest).filter(Guest.phone.contains(pattern)).all()
-        for guest in test_guests:
-            if {"name": guest.name, "phone": guest.phone} not in deleted_guests:
-                deleted_guests.append({"name": guest.name, "phone": guest.phone})
-                session.delete(guest)
-    
+    matches = session.query(Guest.id, Guest.name, Guest.phone).filter(or_(*conditions)).all()
+    deleted_guests = [{"name": name, "phone": phone} for _, name, phone in matches]
+
+    if dry_run:
+        session.close()
+        logger.info("🔎 Dry run: %s test guests would be deleted", len(deleted_guests))
+        return jsonify({
+            "message": f"{len(deleted_guests)} test guests would be deleted",
+            "deleted_guests": deleted_guests,
+            "dry_run": True
+        })
+
+    ids = [guest_id for guest_id, _, _ in matches]
+    for i in range(0, len(ids), PURGE_CHUNK_SIZE):
+        session.execute(delete(Guest).where(Guest.id.in_(ids[i:i + PURGE_CHUNK_SIZE])))
+    if ids:
+        record_guest_changes(session, 'deleted', ids)
     session.commit()
     session.close()
-    
-    logger.info(f"🗑️ Deleted {len(deleted_guests)} test guests")
+    guest_cache.invalidate(*(g["phone"] for g in deleted_guests))
+
+    logger.info("🗑️ Deleted %s test guests", len(deleted_guests))
     return jsonify({
         "message": f"Deleted {len(deleted_guests)} test guests",
-        "deleted_guests": deleted_guests
+        "deleted_guests": deleted_guests,
+        "dry_run": False
     })
 
 if __name__ == "__main__":
     logger.info("🚀 Starting Multi-Provider Wedding Invitation Backend...")
-    logger.info(f"📱 WhatsApp Provider: {WHATSAPP_PROVIDER.upper()}")
-    logger.info(f"🔗 Login link: {LOGIN_LINK}")
+    logger.info("📱 WhatsApp Provider: %s", WHATSAPP_PROVIDER.upper())
+    logger.info("🔗 Login link: %s", LOGIN_LINK)
 
     config = PROVIDERS.get(WHATSAPP_PROVIDER, {})
     port = int(os.getenv('PORT', 5000))
     host = os.getenv('HOST', '0.0.0.0')
-    debug = os.getenv('FLASK_ENV') != 'production'
+    # The dev server is a single process; production runs gunicorn -c gunicorn.conf.py wsgi:app
+    development = (os.getenv('APP_ENV') or os.getenv('FLASK_ENV')) == 'development'
+    debug = parse_bool(os.getenv('FLASK_DEBUG', '1' if development else '0'))
 
-    logger.info(f"🌐 Starting server on {host}:{port} (debug={debug})")
+    create_app()
+    logger.info("🌐 Starting development server on %s:%s (debug=%s)", host, port, debug)
     app.run(debug=debug, host=host, port=port)
\ No newline at end of file
@@ -0,0 +1,258 @@
+# async_senders.py
+"""Asyncio sender engine for high fan-out invite campaigns.
+
+Non-blocking equivalents of the ``send_*_message`` functions, with the same
+True/False contract as ``send_whatsapp_message``. The engine runs its own
+event loop on a background thread, so synchronous callers such as Flask
+routes, the dispatch queue and bulk runs can hand it sends with ``submit`` or
+``send_blocking`` while hundreds of requests stay in flight on one loop.
+
+Requires ``aiohttp``. It is only imported when the engine starts, so the
+default threaded senders keep working without it.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from log_config import sampled
+from metrics import ratelimit_wait_seconds, record_response, record_send
+from phones import plus_phone, wasender_phone, whatsapp_address
+from ratelimit import retry_after_value
+from routing import THROTTLED, failed_send, provider_up
+
+logger = logging.getLogger(__name__)
+
+TWILIO_MESSAGES_URL = 'https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json'
+
+
+class AsyncSender:
+    def __init__(self, providers, provider, rate_limiter=None, max_in_flight=200, router=None, on_accepted=None):
+        self._providers = providers
+        self.provider = provider
+        self._rate_limiter = rate_limiter
+        self._router = router
+        # Called with (provider, message_id, phone) for every message a provider accepts
+        self._on_accepted = on_accepted
+        self.max_in_flight = max_in_flight
+        self._loop = None
+        self._thread = None
+        self._sessions = {}
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    # ---------- Loop lifecycle ----------
+    def start(self):
+        """Start the background event loop (idempotent)"""
+        if self._loop is not None:
+            return
+        with self._lock:
+            if self._loop is not None:
+                return
+            import aiohttp  # noqa: F401 - fail fast if the optional dependency is missing
+
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._semaphore = asyncio.Semaphore(self.max_in_flight)
+                ready.set()
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name="async-sender", daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+            logger.info("⚡ Async sender started (%s sends in flight)", self.max_in_flight)
+
+    def stop(self, timeout=5):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_sessions(), self._loop).result(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._loop = None
+        self._thread = None
+
+    async def _close_sessions(self):
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions = {}
+
+    def _session(self, provider):
+        import aiohttp
+
+        session = self._sessions.get(provider)
+        if session is None:
+            http = self._providers.get(provider, {}).get('http', {})
+            connector = aiohttp.TCPConnector(limit=http.get('pool_size', 16), keepalive_timeout=60)
+            timeout = aiohttp.ClientTimeout(sock_connect=http.get('connect_timeout', 5.0),
+                                            sock_read=http.get('read_timeout', 30.0))
+            session = self._sessions[provider] = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return session
+
+    # ---------- Synchronous bridge ----------
+    def submit(self, phone, message, provider=None):
+        """Schedule a send from any thread; returns a concurrent.futures.Future[bool]"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.send(phone, message, provider), self._loop)
+
+    def send_blocking(self, phone, message):
+        """Drop-in replacement for send_whatsapp_message"""
+        return self.submit(phone, message).result()
+
+    # ---------- Coroutines ----------
+    async def send(self, phone, message, provider=None):
+        if provider is None and self._router is not None:
+            return await self._send_routed(phone, message)
+        provider = (provider or self.provider).lower()
+        async with self._semaphore:
+            try:
+                await self._wait_for_slot(provider)
+                started = time.perf_counter()
+                if provider == 'authkey':
+                    ok = await self.send_authkey(phone, message)
+                elif provider == 'wasender':
+                    ok = await self.send_wasender(phone, message)
+                elif provider == 'twilio':
+                    ok = await self.send_twilio(phone, message)
+                else:
+                    logger.error("❌ Unknown provider: %s", provider)
+                    return False
+                record_send(provider, ok, time.perf_counter() - started)
+                return ok
+            except Exception as e:
+                logger.error("❌ Async send via %s raised: %s", provider, e, exc_info=True)
+                return False
+
+    async def _send_routed(self, phone, message):
+        """Fail over through the router's providers until one accepts the message"""
+        loop = asyncio.get_running_loop()
+        candidates = await loop.run_in_executor(None, self._router.candidates)
+        outcome = False
+        for provider in candidates:
+            if not self._router.claim(provider):
+                continue
+            started = time.perf_counter()
+            ok = await self.send(phone, message, provider)
+            self._router.record(provider, provider_up(ok), time.perf_counter() - started)
+            if ok:
+                return True
+            if ok is THROTTLED:
+                outcome = THROTTLED
+        return outcome
+
+    async def send_many(self, items, provider=None):
+        """Send (phone, message) pairs concurrently; results keep the input order"""
+        return await asyncio.gather(*(self.send(phone, message, provider) for phone, message in items))
+
+    async def _wait_for_slot(self, provider):
+        if self._rate_limiter is None:
+            return
+        loop = asyncio.get_running_loop()
+        delay = await loop.run_in_executor(None, self._rate_limiter.reserve, provider)
+        if delay > 0:
+            ratelimit_wait_seconds.inc(provider, amount=delay)
+            await asyncio.sleep(delay)
+
+    async def _penalize(self, provider, body, headers):
+        if self._rate_limiter is None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._rate_limiter.penalize, provider, retry_after_value(body, headers))
+
+    def _accepted(self, provider, message_id, phone):
+        if self._on_accepted is not None and message_id:
+            self._on_accepted(provider, str(message_id), phone)
+
+    async def send_authkey(self, phone, message):
+        config = self._providers['authkey']
+        if not config['api_key']:
+            logger.warning("⚠️ Authkey API key not configured")
+            return False
+
+        payload = {
+            "authkey": config['api_key'],
+            "mobiles": plus_phone(phone),
+            "message": message,
+            "sender": config['sender_id'],
+            "route": "4",
+            "country": "0"
+        }
+        async with self._session('authkey').post(config['api_url'], data=payload) as response:
+            record_response('authkey', response.status)
+            body = await response.json(content_type=None) if response.status in (200, 429) else None
+            if response.status == 429:
+                await self._penalize('authkey', body, response.headers)
+                return THROTTLED
+            if response.status == 200 and isinstance(body, dict) and body.get('Status') == 'success':
+                logger.info("✅ Authkey message sent: %s", body, extra=sampled('send'))
+                self._accepted('authkey', body.get('LogID'), phone)
+                return True
+            logger.error("❌ Authkey error %s: %s", response.status, body)
+            return failed_send(response.status)
+
+    async def send_wasender(self, phone, message):
+        config = self._providers['wasender']
+        if not config['api_key']:
+            logger.warning("⚠️ WasenderAPI API key not configured")
+            return False
+
+        headers = {
+            'Authorization': f"Bearer {config['api_key']}",
+            'Accept': 'application/json'
+        }
+        payload = {"to": wasender_phone(phone), "text": message}
+        async with self._session('wasender').post(config['api_url'], json=payload, headers=headers) as response:
+            record_response('wasender', response.status)
+            text = await response.text()
+            if response.status == 200:
+                logger.info("✅ WasenderAPI message sent", extra=sampled('send'))
+                try:
+                    data = json.loads(text).get('data') or {}
+                except (ValueError, AttributeError):
+                    data = {}
+                self._accepted('wasender', data.get('msgId') if isinstance(data, dict) else None, phone)
+                return True
+            if response.status == 429:
+                try:
+                    body = await response.json(content_type=None)
+                except ValueError:
+                    body = None
+                await self._penalize('wasender', body, response.headers)
+                return THROTTLED
+            logger.error("❌ WasenderAPI HTTP error %s: %s", response.status, text)
+            return failed_send(response.status)
+
+    async def send_twilio(self, phone, message):
+        import aiohttp
+
+        config = self._providers['twilio']
+        if not all([config['account_sid'], config['api_key'], config['api_secret']]):
+            logger.warning("⚠️ Twilio not configured")
+            return False
+
+        url = TWILIO_MESSAGES_URL.format(account_sid=config['account_sid'])
+        payload = {
+            "Body": message,
+            "From": config['whatsapp_number'],
+            "To": whatsapp_address(phone)
+        }
+        if config.get('status_callback'):
+            payload["StatusCallback"] = config['status_callback']
+        auth = aiohttp.BasicAuth(config['api_key'], config['api_secret'])
+        async with self._session('twilio').post(url, data=payload, auth=auth) as response:
+            record_response('twilio', response.status)
+            body = await response.json(content_type=None)
+            if response.status in (200, 201):
+                logger.info("✅ Twilio message sent: SID = %s", body.get('sid'), extra=sampled('send'))
+                self._accepted('twilio', body.get('sid'), phone)
+                return True
+            if response.status == 429:
+                await self._penalize('twilio', body, response.headers)
+                return THROTTLED
+            logger.error("❌ Twilio API error %s: %s", response.status, body.get('message') if body else '')
+            return failed_send(response.status)
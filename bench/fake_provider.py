@@ -0,0 +1,149 @@
+# bench/fake_provider.py
+"""Local stand-in for the Authkey and WasenderAPI send endpoints.
+
+Answers the same requests the senders make, with configurable latency,
+server errors and 429 responses that carry ``retry_after`` in the body and
+a ``Retry-After`` header. Point the app at it with
+``AUTHKEY_API_URL=http://127.0.0.1:8025/request`` and
+``WASENDER_API_URL=http://127.0.0.1:8025/api/send-message``.
+
+Usage:
+    python -m bench.fake_provider --port 8025 --latency-ms 120 --jitter-ms 40 \\
+        --error-rate 0.01 --rate-limit-rate 0.02 --retry-after 3
+
+``GET /stats`` returns the counts of requests and responses by status.
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+AUTHKEY_PATH = '/request'
+WASENDER_PATH = '/api/send-message'
+
+
+class FakeProvider:
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=100.0, jitter_ms=30.0,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=2):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self._ids = itertools.count(1)
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-provider", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] = self._stats.get(key, 0) + 1
+
+    def _respond(self, path):
+        """(status, headers, body) for one send"""
+        delay = max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000.0
+        time.sleep(delay)
+
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return 429, {'Retry-After': str(self.retry_after)}, {
+                "success": False, "message": "Too many requests", "retry_after": self.retry_after}
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500, {}, {"success": False, "message": "Internal error"}
+
+        message_id = next(self._ids)
+        if path == AUTHKEY_PATH:
+            return 200, {}, {"Status": "success", "Message": "Submitted Successfully", "LogID": message_id}
+        return 200, {}, {"success": True, "data": {"msgId": message_id, "status": "in_progress"}}
+
+    def _handler(self):
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send_json(self, status, body, headers=None):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path == '/stats':
+                    self._send_json(200, provider.stats())
+                else:
+                    self._send_json(404, {"message": "Not found"})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if self.path not in (AUTHKEY_PATH, WASENDER_PATH):
+                    self._send_json(404, {"message": "Not found"})
+                    return
+                provider._count('requests')
+                if self.path == WASENDER_PATH and not self.headers.get('Authorization', '').startswith('Bearer '):
+                    provider._count('401')
+                    self._send_json(401, {"success": False, "message": "Unauthenticated"})
+                    return
+                status, headers, body = provider._respond(self.path)
+                provider._count(str(status))
+                self._send_json(status, body, headers)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Authkey/WasenderAPI endpoint for load tests")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency-ms', type=float, default=100.0, help="mean response latency")
+    parser.add_argument('--jitter-ms', type=float, default=30.0, help="latency standard deviation")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of 500 responses")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument('--retry-after', type=int, default=2, help="retry_after seconds sent with 429s")
+    args = parser.parse_args(argv)
+
+    provider = FakeProvider(args.host, args.port, args.latency_ms, args.jitter_ms,
+                            args.error_rate, args.rate_limit_rate, args.retry_after)
+    print(f"Fake provider listening on {provider.url} "
+          f"(authkey {AUTHKEY_PATH}, wasender {WASENDER_PATH}, stats /stats)")
+    try:
+        provider.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        provider.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+# bench/loadtest.py
+"""Offline load test for the invitation backend.
+
+Starts the fake provider and the Flask app in-process (threaded WSGI server
+on a random port, throwaway SQLite database), seeds guests, then drives real
+HTTP traffic at the API and prints throughput and latency percentiles per
+scenario.
+
+Scenarios:
+    login     login storm with a mix of right and wrong passwords
+    rsvp      RSVP burst across random guests
+    guests    full /api/guests listing plus paginated pages
+    invites   one bulk invite run through the fake provider
+
+Usage (from the repository root):
+    python -m bench.loadtest                            # every scenario
+    python -m bench.loadtest --guests 5000 --requests 5000 --concurrency 64 login rsvp
+    python -m bench.loadtest --provider authkey --latency-ms 250 --rate-limit-rate 0.05 invites
+    python -m bench.loadtest --json results.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench.fake_provider import AUTHKEY_PATH, WASENDER_PATH, FakeProvider
+
+SCENARIOS = ('login', 'rsvp', 'guests', 'invites')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(name, latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    total = len(latencies) + errors
+    return {
+        "scenario": name,
+        "requests": total,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput": round(total / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+    }
+
+
+def drive(name, base_url, make_request, count, concurrency, ok_statuses=(200,)):
+    """Fire ``count`` requests from ``concurrency`` threads with keep-alive sessions"""
+    local = threading.local()
+
+    def one(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        method, path, body = make_request(i)
+        started = time.perf_counter()
+        try:
+            response = session.request(method, base_url + path, json=body, timeout=60)
+            ok = response.status_code in ok_statuses
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for seconds, ok in pool.map(one, range(count)):
+            if ok:
+                latencies.append(seconds)
+            else:
+                errors += 1
+    return summarize(name, latencies, errors, time.perf_counter() - started)
+
+
+def seed_guests(app_module, count):
+    """Insert ``count`` guests directly and return [(phone, password)]"""
+    from sqlalchemy import delete, insert
+
+    from guest_import import generate_passwords
+    from models import Guest, record_guest_changes
+
+    passwords = generate_passwords(count)
+    rows = [{"name": f"Load Guest {i}", "phone": f"+2782{i:07d}", "password": password,
+             "invite_sent": False, "rsvp_status": "pending"} for i, password in enumerate(passwords)]
+    session = app_module.SessionFactory()
+    try:
+        session.execute(delete(Guest))
+        for start in range(0, len(rows), 1000):
+            session.execute(insert(Guest), rows[start:start + 1000])
+        record_guest_changes(session, 'cleared')
+        session.commit()
+    finally:
+        session.close()
+    app_module.guest_cache.clear()
+    return [(row["phone"], row["password"]) for row in rows]
+
+
+def run_login(base_url, guests, args):
+    def make_request(i):
+        phone, password = random.choice(guests)
+        if random.random() < 0.1:
+            password = 'WRONG000'
+        return 'POST', '/api/login', {"phone": phone, "password": password}
+    return drive('login', base_url, make_request, args.requests, args.concurrency, ok_statuses=(200, 401))
+
+
+def run_rsvp(base_url, guests, args):
+    def make_request(i):
+        phone, _ = random.choice(guests)
+        return 'POST', '/api/rsvp', {"phone": phone, "status": random.choice(['accepted', 'declined'])}
+    return drive('rsvp', base_url, make_request, args.requests, args.concurrency)
+
+
+def run_guests(base_url, guests, args):
+    requests_count = max(1, args.requests // 10)
+    results = [drive('guests (full list)', base_url, lambda i: ('GET', '/api/guests', None),
+                     requests_count, args.concurrency)]
+
+    pages = max(1, len(guests) // 100)
+    results.append(drive('guests (limit=100, filtered)', base_url,
+                         lambda i: ('GET', f'/api/guests?limit=100&rsvp_status=pending&q=Guest%20{i % pages}',
+                                    None),
+                         requests_count, args.concurrency))
+    return results
+
+
+def run_invites(base_url, guests, args, provider):
+    before = provider.stats()
+    started = time.perf_counter()
+    response = requests.post(base_url + '/api/send_invites',
+                             json={"filter": {"invite_sent": False}, "concurrency": args.send_concurrency},
+                             timeout=60)
+    response.raise_for_status()
+    batch_id = response.json()["batch_id"]
+    while True:
+        batch = requests.get(f"{base_url}/api/send_invites/{batch_id}", timeout=60).json()
+        if batch["status"] != "running":
+            break
+        time.sleep(0.25)
+    elapsed = time.perf_counter() - started
+
+    after = provider.stats()
+    provider_calls = {key: after.get(key, 0) - before.get(key, 0) for key in after}
+    return {
+        "scenario": "invites",
+        "requests": batch["total"],
+        "errors": batch["failed"],
+        "seconds": round(elapsed, 3),
+        "throughput": round(batch["total"] / elapsed, 1) if elapsed else 0.0,
+        "sent": batch["sent"],
+        "provider_responses": provider_calls,
+    }
+
+
+def configure_environment(args, provider, database_path):
+    """Must run before the app module is imported"""
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{database_path}",
+        "FLASK_ENV": "production",
+        "LOG_LEVEL": args.log_level,
+        "LOG_LEVELS": f"werkzeug={args.log_level}",
+        "WHATSAPP_PROVIDER": args.provider,
+        "AUTHKEY_API_KEY": "bench-key",
+        "WASENDER_API_KEY": "bench-key",
+        "AUTHKEY_API_URL": provider.url + AUTHKEY_PATH,
+        "WASENDER_API_URL": provider.url + WASENDER_PATH,
+        f"{args.provider.upper()}_RATE_PER_MINUTE": str(args.rate_per_minute),
+        f"{args.provider.upper()}_RATE_BURST": str(args.rate_burst),
+        "INVITE_RETRY_DELAY": "1",
+    })
+    if args.engine:
+        os.environ["SEND_ENGINE"] = args.engine
+
+
+def print_table(results):
+    columns = ("scenario", "requests", "errors", "seconds", "throughput", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+    print()
+    print("  ".join(f"{c:>12}" if c != "scenario" else f"{c:<30}" for c in columns))
+    for result in results:
+        cells = []
+        for column in columns:
+            value = result.get(column, "-")
+            cells.append(f"{value:<30}" if column == "scenario" else f"{value:>12}")
+        print("  ".join(cells))
+        if "provider_responses" in result:
+            print(f"{'':<30}  provider responses: {result['provider_responses']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the wedding invite API against a fake provider")
+    parser.add_argument('scenarios', nargs='*', help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--guests', type=int, default=2000, help="guests to seed")
+    parser.add_argument('--requests', type=int, default=2000, help="requests per HTTP scenario")
+    parser.add_argument('--concurrency', type=int, default=32, help="client threads")
+    parser.add_argument('--send-concurrency', type=int, default=16, help="bulk invite concurrency")
+    parser.add_argument('--provider', default='wasender', choices=['wasender', 'authkey'])
+    parser.add_argument('--engine', choices=['threads', 'async'], help="SEND_ENGINE for the app")
+    parser.add_argument('--rate-per-minute', type=float, default=600000, help="provider rate limit")
+    parser.add_argument('--rate-burst', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=100.0)
+    parser.add_argument('--jitter-ms', type=float, default=30.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--json', metavar='PATH', help="also write the results as JSON")
+    args = parser.parse_args(argv)
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    provider = FakeProvider(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                            rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after).start()
+    workdir = tempfile.mkdtemp(prefix="wedding-bench-")
+    configure_environment(args, provider, os.path.join(workdir, "bench.db"))
+
+    from werkzeug.serving import make_server
+
+    import app as app_module
+
+    app_module.create_app()
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"Seeding {args.guests} guests...")
+    guests = seed_guests(app_module, args.guests)
+
+    results = []
+    try:
+        for scenario in args.scenarios:
+            print(f"Running {scenario}...")
+            if scenario == 'login':
+                results.append(run_login(base_url, guests, args))
+            elif scenario == 'rsvp':
+                results.append(run_rsvp(base_url, guests, args))
+            elif scenario == 'guests':
+                results.extend(run_guests(base_url, guests, args))
+            elif scenario == 'invites':
+                results.append(run_invites(base_url, guests, args, provider))
+    finally:
+        server.shutdown()
+        provider.stop()
+
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,227 @@
+# build_assets.py
+"""Build responsive, content-hashed gallery images from assets/.
+
+For every source image this writes resized WebP (and AVIF where Pillow
+supports it) variants plus a small thumbnail into assets/build/. Each output
+name carries a hash of its bytes, so it can be cached forever. manifest.json
+records the dimensions and variants of each image and the hash of its
+source, and only sources whose hash changed are re-encoded on the next run.
+
+Usage:
+    python build_assets.py                 # incremental build
+    python build_assets.py --force         # re-encode everything
+    python build_assets.py --widths 640,1280 --formats webp
+
+Requires Pillow.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger("build_assets")
+
+SOURCE_DIR = 'assets'
+OUTPUT_DIR = os.path.join('assets', 'build')
+MANIFEST_NAME = 'manifest.json'
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+DEFAULT_WIDTHS = (480, 960, 1600)
+DEFAULT_THUMB_WIDTH = 160
+DEFAULT_FORMATS = ('avif', 'webp')
+QUALITY = {'webp': 80, 'avif': 55}
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def supported_formats(requested):
+    from PIL import features
+    unknown = [fmt for fmt in requested if fmt not in QUALITY]
+    if unknown:
+        raise ValueError(f"Unsupported output formats: {', '.join(unknown)}")
+    available = [fmt for fmt in requested if features.check(fmt)]
+    for fmt in set(requested) - set(available):
+        logger.warning("⚠️ Pillow has no %s encoder - skipping %s variants", fmt, fmt)
+    return available
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {"version": 1, "images": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def encode(image, fmt):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt.upper(), quality=QUALITY[fmt])
+    return buffer.getvalue()
+
+
+def write_output(output_dir, stem, label, fmt, data):
+    name = f"{stem}-{label}.{hashlib.sha256(data).hexdigest()[:10]}.{fmt}"
+    path = os.path.join(output_dir, name)
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    return name
+
+
+def build_image(source_path, source_hash, output_dir, widths, thumb_width, formats):
+    """Encode every variant of one source; runs in a worker process"""
+    from PIL import Image, ImageOps
+
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    width, height = image.size
+
+    # Never upscale: widths beyond the source collapse to the source width
+    targets = sorted({min(w, width) for w in widths})
+    variants = []
+    for target in targets:
+        resized = image if target == width else image.resize(
+            (target, round(height * target / width)), Image.LANCZOS)
+        for fmt in formats:
+            data = encode(resized, fmt)
+            variants.append({
+                "format": fmt,
+                "width": resized.width,
+                "height": resized.height,
+                "bytes": len(data),
+                "file": write_output(output_dir, stem, f"{resized.width}w", fmt, data),
+            })
+
+    thumb = image.copy()
+    thumb.thumbnail((thumb_width, thumb_width * 4), Image.LANCZOS)
+    thumb_data = encode(thumb, 'webp')
+    thumbnail = {
+        "format": "webp",
+        "width": thumb.width,
+        "height": thumb.height,
+        "bytes": len(thumb_data),
+        "file": write_output(output_dir, stem, "thumb", "webp", thumb_data),
+    }
+
+    return {
+        "source_hash": source_hash,
+        "width": width,
+        "height": height,
+        "variants": variants,
+        "thumbnail": thumbnail,
+    }
+
+
+def outputs_of(entry):
+    files = [variant["file"] for variant in entry.get("variants", [])]
+    if entry.get("thumbnail"):
+        files.append(entry["thumbnail"]["file"])
+    return files
+
+
+def build(source_dir=SOURCE_DIR, output_dir=OUTPUT_DIR, widths=DEFAULT_WIDTHS,
+          thumb_width=DEFAULT_THUMB_WIDTH, formats=DEFAULT_FORMATS, force=False, jobs=None):
+    os.makedirs(output_dir, exist_ok=True)
+    formats = supported_formats(formats)
+    manifest = load_manifest(output_dir)
+    settings = {"widths": sorted(widths), "thumb_width": thumb_width, "formats": sorted(formats),
+                "quality": QUALITY}
+    if manifest.get("settings") != settings:
+        force = True
+    images = manifest.setdefault("images", {})
+
+    sources = sorted(name for name in os.listdir(source_dir)
+                     if name.lower().endswith(SOURCE_EXTENSIONS)
+                     and os.path.isfile(os.path.join(source_dir, name)))
+
+    work = {}
+    for name in sources:
+        path = os.path.join(source_dir, name)
+        source_hash = file_hash(path)
+        entry = images.get(name)
+        up_to_date = (entry and entry.get("source_hash") == source_hash
+                      and all(os.path.exists(os.path.join(output_dir, f)) for f in outputs_of(entry)))
+        if force or not up_to_date:
+            work[name] = (path, source_hash)
+
+    skipped = len(sources) - len(work)
+    if work:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {name: pool.submit(build_image, path, source_hash, output_dir, widths, thumb_width, formats)
+                       for name, (path, source_hash) in work.items()}
+            for name, future in futures.items():
+                images[name] = future.result()
+                logger.info("🖼️ Built %s: %s variants", name, len(images[name]['variants']))
+
+    # Forget sources that no longer exist
+    for name in set(images) - set(sources):
+        del images[name]
+
+    # Remove outputs no longer referenced by the manifest
+    referenced = {f for entry in images.values() for f in outputs_of(entry)}
+    removed = 0
+    for name in os.listdir(output_dir):
+        if name != MANIFEST_NAME and name not in referenced:
+            os.remove(os.path.join(output_dir, name))
+            removed += 1
+
+    manifest["settings"] = settings
+    write_manifest(output_dir, manifest)
+    logger.info("✅ Assets built: %s encoded, %s unchanged, %s stale files removed", len(work), skipped, removed)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build responsive gallery images")
+    parser.add_argument('--source', default=SOURCE_DIR)
+    parser.add_argument('--output', default=OUTPUT_DIR)
+    parser.add_argument('--widths', default=','.join(str(w) for w in DEFAULT_WIDTHS),
+                        help="comma-separated variant widths in pixels")
+    parser.add_argument('--thumb-width', type=int, default=DEFAULT_THUMB_WIDTH)
+    parser.add_argument('--formats', default=','.join(DEFAULT_FORMATS), help="comma-separated: avif,webp")
+    parser.add_argument('--force', action='store_true', help="re-encode every image")
+    parser.add_argument('--jobs', type=int, default=None, help="encoder processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        build(
+            source_dir=args.source,
+            output_dir=args.output,
+            widths=[int(w) for w in args.widths.split(',') if w.strip()],
+            thumb_width=args.thumb_width,
+            formats=[f.strip().lower() for f in args.formats.split(',') if f.strip()],
+            force=args.force,
+            jobs=args.jobs,
+        )
+    except ImportError:
+        logger.error("❌ Pillow is required: pip install Pillow")
+        return 1
+    except ValueError as e:
+        logger.error("❌ %s", e)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+# bulk.py
+"""Server-side bulk invite runs with bounded concurrency.
+
+A run sends to every target on a thread pool limited to ``concurrency``
+in-flight sends (or on the asyncio engine, bounded by its own in-flight
+limit), and commits ``invite_sent`` flags and the progress counters
+in batches. Progress lives in the ``invite_batches`` table, so any worker
+process can answer a poll for it.
+
+A guest whose send came back ``THROTTLED`` (a provider 429) is sent again,
+up to ``throttle_retries`` times; the rate limiter holds the retry until
+the provider's back-off has passed. A running batch whose progress has not
+moved for ``stale_after`` seconds lost its process and is marked
+``interrupted`` the next time it is polled or a batch starts. Its unsent
+guests still have ``invite_sent`` false, so a run over the
+``{"invite_sent": false}`` filter picks them up.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from models import Guest, InviteBatch, record_guest_changes
+from routing import THROTTLED
+
+logger = logging.getLogger(__name__)
+
+
+class BulkInviteRunner:
+    def __init__(self, session_factory, send_func, message_func, commit_every=25, flush_interval=2.0,
+                 stale_after=300, async_sender=None, throttle_retries=3):
+        self._session_factory = session_factory
+        self._send = send_func
+        # When set, sends go to the asyncio engine instead of a thread pool
+        self._async_sender = async_sender
+        self._build_message = message_func
+        self.commit_every = commit_every
+        self.flush_interval = flush_interval
+        # A running batch with no progress for this long lost its process
+        self.stale_after = stale_after
+        self.throttle_retries = throttle_retries
+
+    def start(self, guests, concurrency):
+        """Record a new batch and send to ``guests`` in the background.
+
+        ``guests`` is a list of (id, name, phone, password) tuples.
+        """
+        self._recover_stale()
+
+        session = self._session_factory()
+        try:
+            batch = InviteBatch(total=len(guests), concurrency=concurrency)
+            if not guests:
+                batch.status = "completed"
+                batch.finished_at = datetime.utcnow()
+            session.add(batch)
+            session.commit()
+            batch_id = batch.id
+        finally:
+            session.close()
+
+        if guests:
+            thread = threading.Thread(target=self._run, args=(batch_id, guests, concurrency),
+                                      name=f"bulk-invite-{batch_id}", daemon=True)
+            thread.start()
+            logger.info("📨 Bulk invite batch %s started: %s guests, concurrency %s", batch_id, len(guests), concurrency)
+        return batch_id
+
+    def get(self, batch_id):
+        self._recover_stale(batch_id)
+        session = self._session_factory()
+        try:
+            batch = session.get(InviteBatch, batch_id)
+            return self.serialize(batch) if batch else None
+        finally:
+            session.close()
+
+    @staticmethod
+    def serialize(batch):
+        done = batch.sent + batch.failed
+        return {
+            "id": batch.id,
+            "status": batch.status,
+            "total": batch.total,
+            "sent": batch.sent,
+            "failed": batch.failed,
+            "remaining": batch.total - done,
+            "percent": round(100.0 * done / batch.total, 1) if batch.total else 100.0,
+            "concurrency": batch.concurrency,
+            "created_at": batch.created_at.isoformat() if batch.created_at else None,
+            "finished_at": batch.finished_at.isoformat() if batch.finished_at else None,
+        }
+
+    def _recover_stale(self, batch_id=None):
+        """Mark running batches (or just ``batch_id``) that stopped making progress as interrupted"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        stmt = (update(InviteBatch)
+                .where(InviteBatch.status == "running", InviteBatch.updated_at < cutoff)
+                .values(status="interrupted", finished_at=datetime.utcnow()))
+        if batch_id is not None:
+            stmt = stmt.where(InviteBatch.id == batch_id)
+        session = self._session_factory()
+        try:
+            result = session.execute(stmt)
+            session.commit()
+            if result.rowcount:
+                logger.warning("⚠️ Marked %s stalled bulk invite batches interrupted", result.rowcount)
+        finally:
+            session.close()
+
+    def _send_one(self, name, phone, message):
+        try:
+            return self._send(phone, message)
+        except Exception as e:
+            logger.error("❌ Bulk invite to %s raised: %s", name, e, exc_info=True)
+            return False
+
+    def _run(self, batch_id, guests, concurrency):
+        sent_ids = []
+        failed = 0
+        last_flush = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"bulk-{batch_id}") as pool:
+            futures = {}
+
+            def submit(guest_id, name, phone, message, tries):
+                if self._async_sender is not None:
+                    future = self._async_sender.submit(phone, message)
+                else:
+                    future = pool.submit(self._send_one, name, phone, message)
+                futures[future] = (guest_id, name, phone, message, tries)
+                return future
+
+            pending = set()
+            for guest_id, name, phone, password in guests:
+                pending.add(submit(guest_id, name, phone, self._build_message(name, password), 0))
+
+            while pending:
+                done, pending = wait(pending, timeout=self.flush_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    guest_id, name, phone, message, tries = futures.pop(future)
+                    try:
+                        success = future.result()
+                    except Exception as e:
+                        logger.error("❌ Bulk invite to guest %s raised: %s", guest_id, e, exc_info=True)
+                        success = False
+                    if success:
+                        sent_ids.append(guest_id)
+                    elif success is THROTTLED and tries < self.throttle_retries:
+                        # Back through the rate limiter, which now holds the provider's back-off
+                        pending.add(submit(guest_id, name, phone, message, tries + 1))
+                    else:
+                        failed += 1
+
+                due = time.monotonic() - last_flush >= self.flush_interval
+                if len(sent_ids) + failed >= self.commit_every or due:
+                    self._flush(batch_id, sent_ids, failed)
+                    sent_ids, failed = [], 0
+                    last_flush = time.monotonic()
+
+        self._flush(batch_id, sent_ids, failed, finished=True)
+        logger.info("✅ Bulk invite batch %s finished", batch_id)
+
+    def _flush(self, batch_id, sent_ids, failed, finished=False):
+        session = self._session_factory()
+        try:
+            if sent_ids:
+                session.execute(update(Guest).where(Guest.id.in_(sent_ids)).values(invite_sent=True))
+                record_guest_changes(session, 'invited', sent_ids)
+            values = {
+                "sent": InviteBatch.sent + len(sent_ids),
+                "failed": InviteBatch.failed + failed,
+                "updated_at": datetime.utcnow(),
+            }
+            if finished:
+                values.update(status="completed", finished_at=datetime.utcnow())
+            session.execute(update(InviteBatch).where(InviteBatch.id == batch_id).values(**values))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error("❌ Bulk invite batch %s flush failed: %s", batch_id, e, exc_info=True)
+        finally:
+            session.close()
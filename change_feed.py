@@ -0,0 +1,205 @@
+# change_feed.py
+"""Incremental guest-list updates for the admin panel.
+
+Every guest write appends rows to ``guest_changes`` in its own transaction
+(``models.record_guest_changes``). The id of the newest row is the change
+version. ``changes_since`` turns the rows after a version into a small delta
+(current rows for changed guests plus deleted ids), collapsing repeated
+changes to one guest. It asks for a full reload (``reset``) when the client
+is too far behind or the log was pruned past its version.
+
+``ChangeFeed`` serves the Server-Sent Events stream. One thread per process
+polls ``max(id)`` (an index lookup) while anyone is subscribed, builds each
+delta once and fans it out, so the DB cost stays the same however many
+admins are watching. Changes made by other worker processes are picked up
+by the same poll.
+
+An open stream holds a request thread for as long as the admin page is
+open (a whole gthread worker thread under gunicorn), so ``max_streams``
+caps them per process. Past the cap ``subscribe`` returns None and the app
+answers 503; the admin page then polls ``/api/guests/changes`` instead.
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+
+from sqlalchemy import delete, func
+
+from models import Guest, GuestChange
+
+logger = logging.getLogger(__name__)
+
+
+def latest_version(session):
+    return session.query(func.max(GuestChange.id)).scalar() or 0
+
+
+def changes_since(session, since, fields, limit=1000):
+    """{"version", "upserted", "deleted", "reset"} covering every change after ``since``"""
+    latest = latest_version(session)
+    oldest = session.query(func.min(GuestChange.id)).scalar()
+    reset = {"version": latest, "upserted": [], "deleted": [], "reset": True}
+    if since > latest or (oldest is not None and since < oldest - 1):
+        return reset  # database replaced, or the log was pruned past this client
+
+    rows = (session.query(GuestChange.id, GuestChange.guest_id, GuestChange.kind)
+            .filter(GuestChange.id > since, GuestChange.id <= latest)
+            .order_by(GuestChange.id).limit(limit + 1).all())
+    if len(rows) > limit or any(kind == 'cleared' for _, _, kind in rows):
+        return reset  # a full reload is cheaper
+
+    last_kind = {}
+    for _, guest_id, kind in rows:
+        last_kind[guest_id] = kind
+    changed = [guest_id for guest_id, kind in last_kind.items() if kind != 'deleted']
+    upserted = []
+    if changed:
+        columns = [getattr(Guest, f) for f in fields]
+        upserted = [dict(zip(fields, row)) for row in
+                    session.query(*columns).filter(Guest.id.in_(changed)).order_by(Guest.id)]
+    present = {guest["id"] for guest in upserted}
+    # A guest that was changed and then deleted is gone from the table too
+    deleted = sorted(guest_id for guest_id in last_kind if guest_id not in present)
+    return {"version": latest, "upserted": upserted, "deleted": deleted, "reset": False}
+
+
+def format_event(delta):
+    """One SSE message; the id lets EventSource resume with Last-Event-ID"""
+    return f"id: {delta['version']}\nevent: changes\ndata: {json.dumps(delta, separators=(',', ':'))}\n\n"
+
+
+class ChangeFeed:
+    def __init__(self, session_factory, fields, poll_interval=0.5, retention=10000, heartbeat=15.0,
+                 max_streams=2):
+        self._session_factory = session_factory
+        self.fields = tuple(fields)
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.heartbeat = heartbeat
+        self.max_streams = max_streams
+        self.version = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_prune = 0.0
+
+    # ---------- Queries ----------
+    def delta(self, since):
+        session = self._session_factory()
+        try:
+            return changes_since(session, since, self.fields)
+        finally:
+            session.close()
+
+    def prune(self):
+        """Drop change rows beyond the newest ``retention``; lagging clients get a reset"""
+        session = self._session_factory()
+        try:
+            cutoff = latest_version(session) - self.retention
+            if cutoff > 0:
+                result = session.execute(delete(GuestChange).where(GuestChange.id <= cutoff))
+                session.commit()
+                if result.rowcount:
+                    logger.info("🧹 Pruned %s guest change rows", result.rowcount)
+        finally:
+            session.close()
+
+    # ---------- Subscribers ----------
+    def subscribers(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def subscribe(self):
+        """A queue of (start version, delta) broadcasts, or None when ``max_streams`` are open"""
+        self.start()
+        subscriber = queue.SimpleQueue()
+        with self._lock:
+            if len(self._subscribers) >= self.max_streams:
+                return None
+            self._subscribers.add(subscriber)
+        if self.version is None:
+            # Pin the broadcast baseline before the caller reads its catch-up,
+            # so nothing committed in between can fall through the gap
+            session = self._session_factory()
+            try:
+                latest = latest_version(session)
+            finally:
+                session.close()
+            with self._lock:
+                if self.version is None:
+                    self.version = latest
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, since, subscriber):
+        """SSE generator: catch up from ``since``, then relay deltas as they are built"""
+        try:
+            yield f"retry: {int(self.poll_interval * 4000)}\n\n"
+            delta = self.delta(since)
+            version = delta["version"]
+            if delta["reset"] or delta["upserted"] or delta["deleted"]:
+                yield format_event(delta)
+            while True:
+                try:
+                    start, delta = subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if delta["version"] <= version:
+                    continue
+                if start > version:
+                    delta = self.delta(version)  # missed a broadcast; build this client's own catch-up
+                version = delta["version"]
+                yield format_event(delta)
+        finally:
+            self.unsubscribe(subscriber)
+
+    # ---------- Poller ----------
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+                self._thread.start()
+                logger.info("📡 Guest change feed started (poll every %.0f ms)", self.poll_interval * 1000)
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                if not self._subscribers:
+                    self.version = None  # nobody listening; no DB work
+                    continue
+            try:
+                self._poll()
+                if time.monotonic() - self._last_prune > 3600:
+                    self._last_prune = time.monotonic()
+                    self.prune()
+            except Exception as e:
+                logger.error("❌ Guest change feed poll failed: %s", e, exc_info=True)
+
+    def _poll(self):
+        session = self._session_factory()
+        try:
+            latest = latest_version(session)
+            with self._lock:
+                if self.version is None:
+                    self.version = latest
+                    return
+            if latest == self.version:
+                return
+            delta = changes_since(session, self.version, self.fields)
+        finally:
+            session.close()
+        start, self.version = self.version, delta["version"]
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.put((start, delta))
@@ -0,0 +1,206 @@
+# delivery.py
+"""Delivery-status tracking for sent invites.
+
+Senders report each accepted message id with ``track``. The Twilio and
+WasenderAPI webhooks report ``sent``/``delivered``/``read``/``failed``
+updates for those ids with ``record``. Both land in an in-memory buffer
+keyed by (provider, message id), where a burst of callbacks for one message
+collapses into its furthest status. A background thread writes the buffer
+to ``message_statuses`` every ``flush_interval`` seconds, or sooner once
+``max_batch`` messages are pending, with one SELECT ... IN and one commit.
+
+Statuses only move forward (see ``STATUS_RANK``), so callbacks arriving out
+of order never downgrade a row. Events still buffered when the process dies
+are lost. That is at most ``flush_interval`` seconds of updates, and later
+callbacks for the same message repair the row.
+"""
+
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import case, func
+
+from models import Guest, MessageStatus
+from phones import normalize_phone
+
+logger = logging.getLogger(__name__)
+
+STATUS_RANK = {
+    'queued': 0, 'accepted': 0, 'pending': 0,
+    'sent': 1,
+    'delivered': 2,
+    'read': 3, 'played': 3,
+    'undelivered': 4, 'failed': 4,
+}
+
+# WasenderAPI (Baileys) numeric message ack levels
+WASENDER_ACK_STATUS = {0: 'failed', 1: 'pending', 2: 'sent', 3: 'delivered', 4: 'read', 5: 'played'}
+
+
+def twilio_event(form):
+    """(message_id, status, phone, error_code) from a Twilio status callback form"""
+    status = (form.get('MessageStatus') or form.get('SmsStatus') or '').lower()
+    phone = (form.get('To') or '').replace('whatsapp:', '')
+    return form.get('MessageSid'), status, phone or None, form.get('ErrorCode') or None
+
+
+def wasender_events(payload):
+    """(message_id, status, phone, error_code) tuples from a WasenderAPI webhook body"""
+    if not isinstance(payload, dict):
+        return []
+    data = payload.get('data')
+    items = data if isinstance(data, list) else [data]
+    events = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        key = item.get('key') or {}
+        message_id = key.get('id') or item.get('msgId') or item.get('id')
+        status = (item.get('update') or {}).get('status', item.get('status'))
+        if isinstance(status, int) or (isinstance(status, str) and status.isdigit()):
+            status = WASENDER_ACK_STATUS.get(int(status))
+        phone = (key.get('remoteJid') or item.get('to') or '').split('@')[0]
+        if message_id and status:
+            events.append((str(message_id), str(status).lower(), phone or None, item.get('error')))
+    return events
+
+
+class StatusWriter:
+    def __init__(self, session_factory, flush_interval=1.0, max_batch=500):
+        self._session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending = {}  # (provider, message_id) -> event dict
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.flushed = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="status-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        """Flush whatever is buffered and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    # ---------- Producers ----------
+    def track(self, provider, message_id, phone):
+        """A provider accepted a message; remember which guest it belongs to"""
+        if message_id:
+            self.record(provider, message_id, 'sent', phone=phone)
+
+    def record(self, provider, message_id, status, phone=None, error_code=None):
+        rank = STATUS_RANK.get(status)
+        if rank is None or not message_id:
+            return False
+        now = datetime.utcnow()
+        key = (provider, str(message_id))
+        with self._lock:
+            event = self._pending.get(key)
+            if event is None:
+                event = self._pending[key] = {"status": status, "rank": rank, "phone": phone,
+                                              "error_code": error_code, "delivered_at": None, "read_at": None}
+            elif rank > event["rank"]:
+                event.update(status=status, rank=rank)
+            event["phone"] = event["phone"] or phone
+            event["error_code"] = error_code or event["error_code"]
+            if rank >= STATUS_RANK['delivered'] and rank < STATUS_RANK['failed']:
+                event["delivered_at"] = event["delivered_at"] or now
+            if rank == STATUS_RANK['read']:
+                event["read_at"] = event["read_at"] or now
+            backlog = len(self._pending)
+        if backlog >= self.max_batch:
+            self._wake.set()
+        return True
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    # ---------- Writer ----------
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        session = self._session_factory()
+        try:
+            existing = {}
+            by_provider = {}
+            for provider, message_id in batch:
+                by_provider.setdefault(provider, []).append(message_id)
+            for provider, ids in by_provider.items():
+                rows = session.query(MessageStatus).filter(
+                    MessageStatus.provider == provider, MessageStatus.message_id.in_(ids))
+                existing.update({(row.provider, row.message_id): row for row in rows})
+
+            phones = {normalize_phone(event["phone"]) for key, event in batch.items()
+                      if event["phone"] and (key not in existing or existing[key].guest_id is None)}
+            guest_ids = dict(session.query(Guest.phone, Guest.id).filter(Guest.phone.in_(phones))) if phones else {}
+
+            for (provider, message_id), event in batch.items():
+                phone = normalize_phone(event["phone"]) if event["phone"] else None
+                row = existing.get((provider, message_id))
+                if row is None:
+                    row = MessageStatus(provider=provider, message_id=message_id, status=event["status"],
+                                        status_rank=event["rank"], phone=phone)
+                    session.add(row)
+                elif event["rank"] > row.status_rank:
+                    row.status, row.status_rank = event["status"], event["rank"]
+                if row.guest_id is None and phone in guest_ids:
+                    row.guest_id = guest_ids[phone]
+                row.phone = row.phone or phone
+                row.error_code = event["error_code"] or row.error_code
+                row.delivered_at = row.delivered_at or event["delivered_at"]
+                row.read_at = row.read_at or event["read_at"]
+            session.commit()
+            self.flushed += len(batch)
+            logger.debug("📝 Flushed %s message status updates", len(batch))
+            return len(batch)
+        except Exception as e:
+            session.rollback()
+            logger.error("❌ Message status flush failed, re-buffering %s updates: %s", len(batch), e, exc_info=True)
+            with self._lock:
+                for key, event in batch.items():
+                    self._pending.setdefault(key, event)
+            return 0
+        finally:
+            session.close()
+
+
+def latest_status_by_guest(session, guest_ids=None):
+    """{guest_id: furthest status reached by any message to that guest} in one grouped query.
+
+    A successful delivery outranks a failed resend, so 'failed' only shows
+    when nothing to that guest got through.
+    """
+    failed_rank = STATUS_RANK['failed']
+    best_success = func.max(case((MessageStatus.status_rank < failed_rank, MessageStatus.status_rank)))
+    query = session.query(MessageStatus.guest_id, best_success).filter(
+        MessageStatus.guest_id.isnot(None)).group_by(MessageStatus.guest_id)
+    if guest_ids is not None:
+        query = query.filter(MessageStatus.guest_id.in_(guest_ids))
+    names = {0: 'queued', 1: 'sent', 2: 'delivered', 3: 'read'}
+    return {guest_id: names[rank] if rank is not None else 'failed' for guest_id, rank in query}
@@ -0,0 +1,271 @@
+# dispatch.py
+"""Durable outbound WhatsApp queue drained by background worker threads.
+
+Jobs live in the ``outbound_messages`` table next to ``Guest`` so they survive
+a process restart. Workers claim a job with a conditional UPDATE, which keeps
+two workers (or two processes sharing the database) from sending the same
+message twice.
+
+A claimed job is leased, not owned outright. While a worker holds it, even
+asleep waiting for a rate-limit slot, a maintenance thread refreshes its
+``updated_at`` every ``stale_after / 4`` seconds. The same thread re-queues
+``sending`` jobs whose lease has not been renewed for ``stale_after``
+seconds, i.e. ones claimed by a process that has since died.
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from log_config import sampled
+from models import Guest, OutboundMessage, record_guest_changes
+
+logger = logging.getLogger(__name__)
+
+
+class DispatchQueue:
+    def __init__(self, session_factory, send_func, workers=4, poll_interval=1.0, stale_after=120,
+                 retry_hint=None):
+        self._session_factory = session_factory
+        self._send = send_func
+        # Optional callable returning the provider's own back-off in seconds
+        self._retry_hint = retry_hint
+        self.workers = workers
+        self.poll_interval = poll_interval
+        # Jobs whose lease went unrenewed this long were owned by a dead process
+        self.stale_after = stale_after
+        self._leased = set()  # ids of jobs this process is sending
+        self._lease_lock = threading.Lock()
+        self._threads = []
+        self._started = False
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+
+    # ---------- Producer side ----------
+    def enqueue(self, phone, message, guest_id=None, max_attempts=1, retry_delay=5):
+        """Persist a message and return its job id immediately"""
+        session = self._session_factory()
+        try:
+            job = OutboundMessage(
+                guest_id=guest_id,
+                phone=phone,
+                message=message,
+                max_attempts=max_attempts,
+                retry_delay=retry_delay,
+            )
+            session.add(job)
+            session.commit()
+            job_id = job.id
+        finally:
+            session.close()
+
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        session = self._session_factory()
+        try:
+            job = session.get(OutboundMessage, job_id)
+            return self.serialize(job) if job else None
+        finally:
+            session.close()
+
+    def depth(self):
+        """Number of jobs still waiting to be sent"""
+        session = self._session_factory()
+        try:
+            return session.query(OutboundMessage).filter(
+                OutboundMessage.status.in_(["queued", "sending"])
+            ).count()
+        finally:
+            session.close()
+
+    @staticmethod
+    def serialize(job):
+        return {
+            "id": job.id,
+            "guest_id": job.guest_id,
+            "status": job.status,
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts,
+            "next_attempt_at": job.next_attempt_at.isoformat() if job.next_attempt_at else None,
+            "last_error": job.last_error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+        }
+
+    # ---------- Worker lifecycle ----------
+    def start(self):
+        """Recover orphaned jobs and start the worker pool (idempotent)"""
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._recover_stale()
+            self._stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"dispatch-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._maintain, name="dispatch-lease", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+            self._started = True
+            logger.info("📬 Dispatch queue started with %s workers", self.workers)
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._started = False
+
+    def _maintain(self):
+        """Renew this process's leases and re-queue expired ones until stopped"""
+        interval = self.stale_after / 4
+        while not self._stopping.wait(interval):
+            try:
+                self._renew_leases()
+                self._recover_stale()
+            except Exception as e:
+                logger.error("❌ Dispatch lease upkeep failed: %s", e, exc_info=True)
+
+    def _renew_leases(self):
+        with self._lease_lock:
+            job_ids = list(self._leased)
+        if not job_ids:
+            return
+        session = self._session_factory()
+        try:
+            session.execute(
+                update(OutboundMessage)
+                .where(OutboundMessage.id.in_(job_ids), OutboundMessage.status == "sending")
+                .values(updated_at=datetime.utcnow())
+            )
+            session.commit()
+        finally:
+            session.close()
+
+    def _recover_stale(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        with self._lease_lock:
+            job_ids = list(self._leased)
+        session = self._session_factory()
+        try:
+            result = session.execute(
+                update(OutboundMessage)
+                .where(OutboundMessage.status == "sending", OutboundMessage.updated_at < cutoff,
+                       OutboundMessage.id.not_in(job_ids))
+                .values(status="queued", updated_at=datetime.utcnow())
+            )
+            session.commit()
+            if result.rowcount:
+                logger.warning("♻️ Re-queued %s interrupted dispatch jobs", result.rowcount)
+        finally:
+            session.close()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._claim()
+            except Exception as e:
+                logger.error("❌ Dispatch claim failed: %s", e, exc_info=True)
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            with self._lease_lock:
+                self._leased.add(job["id"])
+            try:
+                self._process(job)
+            finally:
+                with self._lease_lock:
+                    self._leased.discard(job["id"])
+
+    def _claim(self):
+        """Atomically move the next due job from queued to sending"""
+        session = self._session_factory()
+        try:
+            while True:
+                now = datetime.utcnow()
+                candidate = session.query(OutboundMessage.id).filter(
+                    OutboundMessage.status == "queued",
+                    OutboundMessage.next_attempt_at <= now,
+                ).order_by(OutboundMessage.next_attempt_at, OutboundMessage.id).first()
+                if candidate is None:
+                    return None
+
+                result = session.execute(
+                    update(OutboundMessage)
+                    .where(OutboundMessage.id == candidate.id, OutboundMessage.status == "queued")
+                    .values(status="sending", attempts=OutboundMessage.attempts + 1, updated_at=now)
+                )
+                session.commit()
+                if result.rowcount == 1:
+                    job = session.get(OutboundMessage, candidate.id)
+                    return {
+                        "id": job.id,
+                        "guest_id": job.guest_id,
+                        "phone": job.phone,
+                        "message": job.message,
+                        "attempts": job.attempts,
+                        "max_attempts": job.max_attempts,
+                        "retry_delay": job.retry_delay,
+                    }
+                # Another worker won the race; try the next one
+        finally:
+            session.close()
+
+    def _retry_delay_hint(self):
+        if self._retry_hint is None:
+            return 0
+        try:
+            return self._retry_hint()
+        except Exception as e:
+            logger.warning("⚠️ Retry hint unavailable: %s", e)
+            return 0
+
+    def _process(self, job):
+        try:
+            success = self._send(job["phone"], job["message"])
+            error = None if success else "Provider rejected the message"
+        except Exception as e:
+            logger.error("❌ Dispatch job %s raised: %s", job['id'], e, exc_info=True)
+            success, error = False, str(e)
+
+        session = self._session_factory()
+        try:
+            now = datetime.utcnow()
+            if success:
+                values = {"status": "sent", "last_error": None}
+                if job["guest_id"] is not None:
+                    session.execute(
+                        update(Guest).where(Guest.id == job["guest_id"]).values(invite_sent=True)
+                    )
+                    record_guest_changes(session, 'invited', [job["guest_id"]])
+                logger.info("✅ Dispatch job %s sent", job['id'], extra=sampled('dispatch'))
+            elif job["attempts"] < job["max_attempts"]:
+                delay = max(job["retry_delay"], self._retry_delay_hint())
+                values = {
+                    "status": "queued",
+                    "last_error": error,
+                    "next_attempt_at": now + timedelta(seconds=delay),
+                }
+                logger.info("⏳ Dispatch job %s retrying in %.0f seconds (attempt %s/%s)",
+                            job['id'], delay, job['attempts'] + 1, job['max_attempts'])
+            else:
+                values = {"status": "failed", "last_error": error}
+                logger.error("❌ Dispatch job %s failed after %s attempts", job['id'], job['attempts'])
+
+            values["updated_at"] = now
+            session.execute(update(OutboundMessage).where(OutboundMessage.id == job["id"]).values(**values))
+            session.commit()
+        finally:
+            session.close()
@@ -0,0 +1,144 @@
+# gallery.py
+"""Gallery manifest for progressive carousel loading.
+
+Lists each photo in assets/ with its dimensions, a tiny inline JPEG
+placeholder (LQIP), and the responsive variants from build_assets.py when
+they exist. The manifest is cached in memory. A rescan (at most every
+``rescan_interval`` seconds) only stats the directory, and an image is only
+opened when it is new or its size or mtime changed.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+PLACEHOLDER_WIDTH = 16
+
+
+class GalleryManifest:
+    def __init__(self, assets_dir='assets', build_dir=None, url_prefix='/assets/', rescan_interval=10.0):
+        self.assets_dir = assets_dir
+        self.build_dir = build_dir or os.path.join(assets_dir, 'build')
+        self.url_prefix = url_prefix
+        self.rescan_interval = rescan_interval
+        self._entries = {}  # name -> (mtime_ns, size, {width, height, placeholder})
+        self._build_stamp = None
+        self._build_images = {}
+        self._manifest = None
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Current manifest, rebuilt incrementally if the files changed"""
+        if self._manifest is not None and time.monotonic() - self._scanned_at < self.rescan_interval:
+            return self._manifest
+        with self._lock:
+            if self._manifest is None or time.monotonic() - self._scanned_at >= self.rescan_interval:
+                self._refresh()
+                self._scanned_at = time.monotonic()
+        return self._manifest
+
+    def _load_build_manifest(self):
+        path = os.path.join(self.build_dir, 'manifest.json')
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            changed = self._build_stamp is not None
+            self._build_stamp, self._build_images = None, {}
+            return changed
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._build_stamp:
+            return False
+        with open(path) as f:
+            self._build_images = json.load(f).get("images", {})
+        self._build_stamp = stamp
+        return True
+
+    def _placeholder(self, name):
+        """Tiny base64 JPEG, made from the built thumbnail when there is one"""
+        from PIL import Image
+
+        thumbnail = self._build_images.get(name, {}).get("thumbnail")
+        thumb_path = os.path.join(self.build_dir, thumbnail["file"]) if thumbnail else None
+        source = thumb_path if thumb_path and os.path.exists(thumb_path) else os.path.join(self.assets_dir, name)
+
+        with Image.open(source) as image:
+            image.draft('RGB', (PLACEHOLDER_WIDTH * 4, PLACEHOLDER_WIDTH * 4))
+            small = image.convert('RGB')
+            small.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH * 4))
+        buffer = io.BytesIO()
+        small.save(buffer, format='JPEG', quality=50)
+        return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+    def _describe(self, name):
+        from PIL import Image
+
+        with Image.open(os.path.join(self.assets_dir, name)) as image:
+            width, height = image.size
+        return {"width": width, "height": height, "placeholder": self._placeholder(name)}
+
+    def _refresh(self):
+        build_changed = self._load_build_manifest()
+        seen = set()
+        changed = build_changed
+        with os.scandir(self.assets_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.lower().endswith(SOURCE_EXTENSIONS):
+                    continue
+                seen.add(entry.name)
+                stat = entry.stat()
+                cached = self._entries.get(entry.name)
+                if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+                    continue
+                try:
+                    self._entries[entry.name] = (stat.st_mtime_ns, stat.st_size, self._describe(entry.name))
+                    changed = True
+                except Exception as e:
+                    logger.error("❌ Could not read gallery image %s: %s", entry.name, e)
+
+        for name in set(self._entries) - seen:
+            del self._entries[name]
+            changed = True
+
+        if changed or self._manifest is None:
+            self._manifest = self._render()
+            logger.info("🖼️ Gallery manifest rebuilt: %s photos", len(self._manifest['photos']))
+
+    def _render(self):
+        photos = []
+        for name in sorted(self._entries, key=natural_key):
+            info = self._entries[name][2]
+            build = self._build_images.get(name, {})
+            photos.append({
+                "name": name,
+                "src": self.url_prefix + name,
+                "width": info["width"],
+                "height": info["height"],
+                "placeholder": info["placeholder"],
+                "thumbnail": self._build_url(build["thumbnail"]["file"]) if build.get("thumbnail") else None,
+                "variants": [
+                    {"url": self._build_url(v["file"]), "width": v["width"], "format": v["format"]}
+                    for v in build.get("variants", [])
+                ],
+            })
+        version = hashlib.sha1(json.dumps(photos, sort_keys=True).encode()).hexdigest()
+        return {"version": version, "photos": photos}
+
+    def _build_url(self, filename):
+        relative = os.path.relpath(os.path.join(self.build_dir, filename), self.assets_dir)
+        return self.url_prefix + relative.replace(os.sep, '/')
+
+
+def natural_key(name):
+    """Sort pic2 before pic10"""
+    stem = os.path.splitext(name)[0]
+    digits = ''.join(ch for ch in stem if ch.isdigit())
+    return (stem.rstrip('0123456789'), int(digits) if digits else -1, name)
@@ -0,0 +1,110 @@
+# group_commit.py
+"""Group commit for RSVP updates.
+
+``RsvpWriter.submit`` queues an update and returns a Future. A single writer
+thread waits ``window`` seconds after the first queued update (or until
+``max_batch`` are queued), then applies the whole batch in one transaction.
+That is one SELECT for the guests that still exist, one UPDATE per status
+value, one guests_version bump plus its change-log rows, and one commit.
+Each Future resolves only after that commit, so callers answer the guest
+once the write is durable.
+Several updates for the same guest in one batch collapse to the last one
+submitted. An update only applies while the guest id still carries the phone
+it was submitted with, so a stale session token cannot reach a guest that
+later reused the id.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy import tuple_, update
+
+from models import Guest, record_guest_changes
+
+logger = logging.getLogger(__name__)
+
+
+class RsvpWriter:
+    def __init__(self, session_factory, window=0.005, max_batch=256):
+        self._session_factory = session_factory
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rsvp-writer", daemon=True)
+                self._thread.start()
+                logger.info("🗳️ RSVP group commit enabled (window %.0f ms, max %s per batch)",
+                            self.window * 1000, self.max_batch)
+
+    def submit(self, guest_id, status, phone):
+        """Future resolving to True once committed, or False if that guest/phone no longer exists"""
+        self.start()
+        future = Future()
+        self._queue.put((guest_id, status, phone, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._apply(batch)
+            except Exception as e:
+                logger.error("❌ RSVP group commit of %s updates failed: %s", len(batch), e, exc_info=True)
+                for *_, future in batch:
+                    future.set_exception(e)
+
+    def _apply(self, batch):
+        latest = {}
+        for guest_id, status, phone, _ in batch:
+            latest[(guest_id, phone)] = status  # later submissions win
+
+        session = self._session_factory()
+        try:
+            existing = {(guest_id, phone) for guest_id, phone in session.query(Guest.id, Guest.phone).filter(
+                Guest.id.in_({guest_id for guest_id, _ in latest}))}
+            by_status = {}
+            for key, status in latest.items():
+                if key in existing:
+                    by_status.setdefault(status, []).append(key)
+            for status, keys in by_status.items():
+                session.execute(update(Guest).where(tuple_(Guest.id, Guest.phone).in_(keys))
+                                .values(rsvp_status=status))
+            if by_status:
+                record_guest_changes(session, 'rsvp', sorted({guest_id for keys in by_status.values()
+                                                              for guest_id, _ in keys}))
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+        self.batches += 1
+        self.writes += len(batch)
+        for guest_id, _, phone, future in batch:
+            future.set_result((guest_id, phone) in existing)
@@ -0,0 +1,69 @@
+# guest_cache.py
+"""Bounded LRU + TTL cache of guest records keyed by normalised phone.
+
+Used by /api/login and /api/rsvp so repeated logins during a burst skip the
+database. Writers invalidate entries explicitly. The TTL bounds staleness for
+writes made by other worker processes, which this process cannot see.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class GuestCache:
+    def __init__(self, maxsize=2048, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, phone):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(phone)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[phone]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(phone)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, phone, record):
+        with self._lock:
+            self._entries[phone] = (time.monotonic() + self.ttl, record)
+            self._entries.move_to_end(phone)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *phones):
+        with self._lock:
+            for phone in phones:
+                if self._entries.pop(phone, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
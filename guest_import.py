@@ -0,0 +1,182 @@
+# guest_import.py
+"""Bulk guest import from CSV or JSON.
+
+Rows are read lazily (CSV straight off the request stream) and processed in
+chunks. Each chunk normalises its phones once and checks them against
+duplicates already seen in the file and against the database with one
+``IN`` query. Passwords for the whole chunk are generated together, and the
+new rows are written with a single executemany INSERT and one commit.
+
+Another request can add the same phone between the check and the INSERT.
+The unique index then fails the whole chunk; it is rolled back, the phones
+are checked again, and the chunk is retried without the rows that now
+exist, which are reported as duplicates.
+
+A file that turns unreadable part-way (bad encoding, broken CSV quoting)
+still keeps the chunks already committed: the rows read so far are
+imported and ``ImportInterrupted`` carries their summary and report.
+"""
+
+import csv
+import io
+import json
+import logging
+import random
+import string
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from models import Guest, record_guest_changes
+from phones import is_valid_phone, normalize_phone
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_ALPHABET = string.ascii_uppercase + string.digits
+
+
+class ImportInterrupted(Exception):
+    """The upload stopped being readable after ``summary["total"]`` rows were processed"""
+
+    def __init__(self, error, summary, report):
+        super().__init__(str(error))
+        self.summary = summary
+        self.report = report
+
+
+def generate_passwords(count, length=8):
+    chars = random.choices(PASSWORD_ALPHABET, k=count * length)
+    return [''.join(chars[i:i + length]) for i in range(0, count * length, length)]
+
+
+def iter_csv_rows(stream):
+    """Yield {name, phone} dicts from a binary CSV stream with a header row"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    for row in reader:
+        extra = row.pop(None, None)  # fields beyond the header, e.g. an unquoted comma in a name
+        row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+        guest = {"name": row.get("name", ""), "phone": row.get("phone", "")}
+        if extra:
+            guest["error"] = f"Expected {len(reader.fieldnames)} fields, got {len(reader.fieldnames) + len(extra)}"
+        yield guest
+
+
+def iter_json_rows(payload):
+    """Accept either a list of guests or {"guests": [...]}"""
+    if isinstance(payload, dict):
+        payload = payload.get("guests")
+    if not isinstance(payload, list):
+        raise ValueError("JSON import must be a list of guests or {\"guests\": [...]}")
+    for row in payload:
+        if not isinstance(row, dict):
+            yield {"name": "", "phone": ""}
+            continue
+        yield {"name": str(row.get("name") or "").strip(), "phone": str(row.get("phone") or "").strip()}
+
+
+def load_json_rows(stream):
+    return iter_json_rows(json.load(io.TextIOWrapper(stream, encoding='utf-8-sig')))
+
+
+class GuestImporter:
+    def __init__(self, session_factory, batch_size=500):
+        self._session_factory = session_factory
+        self.batch_size = batch_size
+
+    def run(self, rows):
+        """Import ``rows`` and return (summary, per-row report)
+
+        Raises ImportInterrupted if reading ``rows`` fails part-way.
+        """
+        report = []
+        seen = set()
+        chunk = []
+        row_number = 0
+        error = None
+        try:
+            for row in rows:
+                row_number += 1
+                chunk.append((row_number, row))
+                if len(chunk) >= self.batch_size:
+                    report.extend(self._import_chunk(chunk, seen))
+                    chunk = []
+        except (ValueError, csv.Error) as e:
+            error = e
+        if chunk:
+            report.extend(self._import_chunk(chunk, seen))
+
+        summary = {"total": len(report), "added": 0, "duplicate": 0, "invalid": 0}
+        for entry in report:
+            summary[entry["status"]] += 1
+        if error is not None:
+            logger.warning("⚠️ Guest import stopped after %s rows: %s (%s)", len(report), error, summary)
+            raise ImportInterrupted(error, summary, report)
+        logger.info("📥 Imported guests: %s", summary)
+        return summary, report
+
+    def _import_chunk(self, chunk, seen):
+        report = []
+        candidates = []
+        for row_number, row in chunk:
+            name = row["name"]
+            phone = normalize_phone(row["phone"])
+            entry = {"row": row_number, "name": name, "phone": phone or row["phone"]}
+            if row.get("error"):
+                entry.update(status="invalid", error=row["error"])
+            elif not name or not is_valid_phone(phone):
+                entry.update(status="invalid", error="Name and a valid phone are required")
+            elif phone in seen:
+                entry.update(status="duplicate", error="Repeated in this import")
+            else:
+                seen.add(phone)
+                candidates.append(entry)
+            report.append(entry)
+
+        if not candidates:
+            return report
+
+        session = self._session_factory()
+        try:
+            candidates = self._drop_existing(session, candidates)
+            while candidates:
+                try:
+                    self._insert(session, candidates)
+                    break
+                except IntegrityError:
+                    # Lost a race with a concurrent add; recheck and retry the rest
+                    session.rollback()
+                    remaining = self._drop_existing(session, candidates)
+                    if len(remaining) == len(candidates):
+                        raise  # not a phone collision
+                    logger.info("📥 %s import rows were added concurrently, retrying chunk",
+                                len(candidates) - len(remaining))
+                    candidates = remaining
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        return report
+
+    def _drop_existing(self, session, candidates):
+        """Mark candidates whose phone is already stored as duplicates; return the rest"""
+        phones = [entry["phone"] for entry in candidates]
+        existing = {phone for (phone,) in session.query(Guest.phone).filter(Guest.phone.in_(phones))}
+        for entry in candidates:
+            if entry["phone"] in existing:
+                entry.pop("password", None)
+                entry.update(status="duplicate", error="Guest already exists")
+        return [entry for entry in candidates if entry["phone"] not in existing]
+
+    def _insert(self, session, entries):
+        passwords = generate_passwords(len(entries))
+        rows = []
+        for entry, password in zip(entries, passwords):
+            entry.update(status="added", password=password)
+            rows.append({"name": entry["name"], "phone": entry["phone"], "password": password,
+                         "invite_sent": False, "rsvp_status": "pending"})
+        session.execute(insert(Guest), rows)
+        added = [guest_id for (guest_id,) in
+                 session.query(Guest.id).filter(Guest.phone.in_([row["phone"] for row in rows]))]
+        record_guest_changes(session, 'added', added)
+        session.commit()
@@ -0,0 +1,76 @@
+# gunicorn.conf.py
+"""Gunicorn settings for the production entry point (wsgi:app).
+
+Environment:
+
+* ``HOST`` / ``PORT``: bind address (default ``0.0.0.0:5000``).
+* ``WEB_CONCURRENCY``: prefork worker processes (default 2).
+* ``GUNICORN_THREADS``: request threads per worker (default 8).
+* ``GUNICORN_TIMEOUT``: seconds before a silent worker is restarted (default 60).
+* ``GUNICORN_MAX_REQUESTS``: recycle a worker after this many requests, with
+  10% jitter (default 0, never).
+* ``GUNICORN_PRELOAD``: load the app in the master before forking (default on).
+  Turning it off requires ``SESSION_SECRET``: otherwise each worker would
+  sign guest tokens with its own random secret and reject the others'.
+* ``APP_ENV``: defaults to ``production`` here and in wsgi.py, so logs are
+  INFO, redacted and sampled unless overridden.
+* ``METRICS_DIR``: where workers share their metrics so any of them can
+  answer a ``/metrics`` scrape for all (default a fresh directory under the
+  system temp dir; emptied at startup).
+
+Every open admin change stream (``/api/guests/stream``) occupies one of a
+worker's ``GUNICORN_THREADS`` for as long as the page is open.
+``CHANGE_FEED_MAX_STREAMS`` (default 2) caps them per worker; keep it well
+below the thread count so regular requests always have threads left.
+Clients over the cap get 503 and fall back to polling.
+
+Behind a TLS-terminating proxy, set ``TWILIO_STATUS_CALLBACK_URL`` to the
+public https URL of ``/api/webhooks/twilio``; Twilio signatures are checked
+against it, not the proxied ``http://`` request URL.
+
+Each worker runs its own invite dispatcher, delivery-status writer and
+caches. Job claims and provider rate limits live in the database, so they
+hold across workers.
+"""
+
+import glob
+import os
+import tempfile
+
+os.environ.setdefault('APP_ENV', 'production')
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), f"guest-metrics-{os.getpid()}"))
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+preload_app = os.getenv('GUNICORN_PRELOAD', '1').lower() in ('1', 'true', 'yes')
+accesslog = None  # request latency is exported on /metrics instead
+
+if not preload_app and not os.getenv('SESSION_SECRET'):
+    raise RuntimeError("SESSION_SECRET must be set when GUNICORN_PRELOAD is off, "
+                       "or guest tokens from one worker are rejected by the others")
+
+
+def on_starting(server):
+    # Counters saved by a previous run would otherwise be added to this one's
+    os.makedirs(os.environ['METRICS_DIR'], exist_ok=True)
+    for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], '*.json')):
+        os.remove(path)
+
+
+def post_fork(server, worker):
+    # Drop DB connections, HTTP pools and the log thread inherited from the master
+    from app import after_fork
+    after_fork()
+
+
+def worker_exit(server, worker):
+    # Keep the exiting worker's final counts in the shared totals
+    import metrics
+    metrics.REGISTRY.write_snapshot()
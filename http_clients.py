@@ -0,0 +1,95 @@
+# http_clients.py
+"""Long-lived, pooled HTTP clients for the WhatsApp providers.
+
+One ``requests.Session`` per provider keeps TLS connections alive between
+messages, and a single Twilio ``Client`` is reused instead of being rebuilt
+for every send. Clients are created lazily under a lock and are safe to share
+between the dispatch, bulk and request threads.
+"""
+
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import record_response
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HTTP = {'pool_size': 16, 'connect_timeout': 5.0, 'read_timeout': 30.0}
+
+
+class ProviderClients:
+    def __init__(self, providers):
+        self._providers = providers
+        self._sessions = {}
+        self._twilio = None
+        self._lock = threading.Lock()
+
+    def http_config(self, provider):
+        return {**DEFAULT_HTTP, **self._providers.get(provider, {}).get('http', {})}
+
+    def timeout(self, provider):
+        """(connect, read) timeout tuple for requests"""
+        config = self.http_config(provider)
+        return (config['connect_timeout'], config['read_timeout'])
+
+    def _build_session(self, provider):
+        pool_size = self.http_config(provider)['pool_size']
+        session = requests.Session()
+        # No transport-level retries: a retried POST could send the message twice
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.hooks['response'].append(
+            lambda response, *args, **kwargs: record_response(provider, response.status_code))
+        logger.info("🔌 Created pooled HTTP session for %s (pool size %s)", provider, pool_size)
+        return session
+
+    def session(self, provider):
+        session = self._sessions.get(provider)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(provider)
+                if session is None:
+                    session = self._sessions[provider] = self._build_session(provider)
+        return session
+
+    def twilio(self):
+        """Shared Twilio REST client backed by a pooled HTTP session"""
+        if self._twilio is None:
+            with self._lock:
+                if self._twilio is None:
+                    from twilio.http.http_client import TwilioHttpClient
+                    from twilio.rest import Client
+
+                    config = self._providers['twilio']
+                    http = self.http_config('twilio')
+                    http_client = TwilioHttpClient(pool_connections=True, timeout=http['read_timeout'])
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=http['pool_size'], max_retries=0)
+                    http_client.session.mount('https://', adapter)
+                    self._twilio = Client(config['api_key'], config['api_secret'], config['account_sid'],
+                                          http_client=http_client)
+                    logger.info("🔌 Created pooled Twilio client (pool size %s)", http['pool_size'])
+        return self._twilio
+
+    def reset(self):
+        """Forget pooled sessions without closing them, for a freshly forked worker.
+
+        The inherited sockets are shared with the parent process, so the child
+        must not close or reuse them; new sessions are built on first use.
+        """
+        with self._lock:
+            self._sessions = {}
+            self._twilio = None
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+            if self._twilio is not None:
+                self._twilio.http_client.session.close()
+            self._twilio = None
@@ -0,0 +1,187 @@
+# log_config.py
+"""Structured, non-blocking logging setup.
+
+``configure_logging()`` replaces ``logging.basicConfig``. Request handlers only
+put the raw LogRecord on an in-memory queue. A listener thread does the
+formatting, redaction and stderr writes. Messages use %-style arguments, so
+records below the active level are never formatted at all.
+
+Environment:
+
+* ``APP_ENV``: ``production`` or ``development``. Falls back to ``FLASK_ENV``
+  (which Flask 3 no longer sets) and defaults to development. ``wsgi.py``
+  sets it to production.
+* ``LOG_LEVEL``: root level. Defaults to INFO in production, otherwise DEBUG.
+* ``LOG_LEVELS``: per-logger overrides, e.g. ``dispatch=DEBUG,werkzeug=WARNING``.
+* ``LOG_FORMAT``: ``json`` (default) or ``text``.
+* ``LOG_REDACT``: mask secrets, message bodies and phone numbers. Defaults to
+  on in production.
+* ``LOG_SAMPLE_RATE`` / ``LOG_SAMPLE_RATES``: keep-ratio for high-frequency
+  events. A call opts in with ``extra=sampled('login')``. The rate comes from
+  ``LOG_SAMPLE_RATES`` (``login=0.05,send=0.1``) or falls back to
+  ``LOG_SAMPLE_RATE``, which is 0.1 in production and 1 otherwise. Warnings
+  and errors are never sampled.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+
+SENSITIVE_KEYS = {'password', 'authkey', 'api_key', 'apikey', 'authorization', 'token', 'secret',
+                  'auth_token', 'message', 'text', 'body'}
+PHONE_RE = re.compile(r'\+?\d{6,11}(\d{4})\b')
+REDACTED = '[redacted]'
+
+DEFAULT_LEVELS = {'urllib3': 'WARNING', 'twilio.http_client': 'WARNING'}
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sample'}
+
+_listener = None
+
+
+def sampled(category):
+    """``extra`` for a high-frequency event that may be sampled"""
+    return {"sample": category}
+
+
+def parse_levels(spec):
+    levels = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def parse_rates(spec):
+    return {name: float(rate) for name, rate in parse_levels(spec).items()}
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {k: REDACTED if str(k).lower() in SENSITIVE_KEYS else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(v) for v in value)
+    if isinstance(value, str):
+        return PHONE_RE.sub(r'***\1', value)
+    return value
+
+
+class SamplingFilter(logging.Filter):
+    """Drops a share of INFO/DEBUG records tagged with ``extra=sampled(...)``"""
+
+    def __init__(self, default_rate=1.0, rates=None):
+        super().__init__()
+        self.default_rate = default_rate
+        self.rates = rates or {}
+
+    def filter(self, record):
+        category = getattr(record, 'sample', None)
+        if category is None or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < self.rates.get(category, self.default_rate)
+
+
+class RedactingFilter(logging.Filter):
+    def filter(self, record):
+        if record.args:
+            record.args = redact(record.args if isinstance(record.args, tuple) else (record.args,))
+            if len(record.args) == 1 and isinstance(record.args[0], dict):
+                record.args = record.args[0]
+        record.msg = redact(record.msg) if isinstance(record.msg, str) else record.msg
+        for key in set(vars(record)) - _RECORD_ATTRS:
+            setattr(record, key, redact(getattr(record, key)))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key in set(vars(record)) - _RECORD_ATTRS:
+            entry[key] = getattr(record, key)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread"""
+
+    def prepare(self, record):
+        return copy.copy(record)
+
+
+def is_production():
+    return (os.getenv('APP_ENV') or os.getenv('FLASK_ENV')) == 'production'
+
+
+def configure_logging():
+    """Install the queue handler on the root logger; safe to call twice"""
+    global _listener
+    if _listener is not None:
+        return
+
+    production = is_production()
+    root_level = os.getenv('LOG_LEVEL', 'INFO' if production else 'DEBUG').upper()
+    redacting = os.getenv('LOG_REDACT', '1' if production else '0').lower() in ('1', 'true', 'yes')
+
+    output = logging.StreamHandler(sys.stderr)
+    if os.getenv('LOG_FORMAT', 'json').lower() == 'text':
+        output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    else:
+        output.setFormatter(JsonFormatter())
+    if redacting:
+        output.addFilter(RedactingFilter())
+
+    handler = DeferredQueueHandler(queue.SimpleQueue())
+    handler.addFilter(SamplingFilter(
+        default_rate=float(os.getenv('LOG_SAMPLE_RATE', 0.1 if production else 1.0)),
+        rates=parse_rates(os.getenv('LOG_SAMPLE_RATES')),
+    ))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(root_level)
+    for name, level in {**DEFAULT_LEVELS, **parse_levels(os.getenv('LOG_LEVELS'))}.items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def restart_after_fork():
+    """Start a fresh listener in a forked worker; the parent's thread does not survive fork()"""
+    global _listener
+    thread = getattr(_listener, '_thread', None)
+    if _listener is not None and thread is not None and thread.is_alive():
+        return
+    _listener = None
+    configure_logging()
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,385 @@
+# metrics.py
+"""In-process metrics in the Prometheus text exposition format.
+
+This is deliberately dependency-free. Counters and histograms are plain
+dicts keyed by label values and guarded by a lock. Gauges are callbacks
+evaluated at scrape time. ``/metrics`` renders the module-level ``REGISTRY``.
+
+Instrumented:
+
+* request latency per Flask route, method and status (``instrument_app``)
+* SQL statement latency per operation (``instrument_engine``)
+* provider send latency and outcome, and provider HTTP status codes
+  (``record_send`` / ``record_response``, called by the senders)
+* gauges registered by the app, e.g. dispatch queue depth, plus this
+  process's resident memory
+
+Every worker process keeps its own registry. Under a prefork server, set
+``METRICS_DIR`` to a directory shared by the workers (``gunicorn.conf.py``
+does this): each worker then saves a snapshot of its registry there every
+``METRICS_FLUSH_SECONDS`` (default 5) and on exit, and ``/metrics`` renders
+all of them together. Counters and histograms are summed across workers,
+including ones that have since exited, so totals never go backwards when a
+scrape lands on a different worker. Gauges are per process and get a
+``pid`` label; those of exited workers are dropped. Other workers' numbers
+can be up to one flush interval old.
+"""
+
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from flask import g, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _with_pid(labels, pid):
+    pair = f'pid="{pid}"'
+    return '{' + pair + '}' if not labels else labels[:-1] + ',' + pair + '}'
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        key = tuple(str(v) for v in labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def combine(total, value):
+        return total + value
+
+    def samples(self, values=None):
+        if values is None:
+            values = self.snapshot()
+        return [(self.name, _labels(self.labelnames, key), value) for key, value in sorted(values.items())]
+
+
+class CallbackCounter(Counter):
+    """Counter whose totals live elsewhere and are read from ``callback`` at scrape time.
+
+    The callback returns a dict of label-value tuples to monotonic totals.
+    """
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def snapshot(self):
+        return {tuple(str(v) for v in key): value for key, value in self.callback().items()}
+
+    def clear(self):
+        pass  # the totals belong to the callback's owner
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *labelvalues):
+        key = tuple(str(v) for v in labelvalues)
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(values) for key, values in self._series.items()}
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    @staticmethod
+    def combine(total, values):
+        return [a + b for a, b in zip(total, values)]
+
+    def samples(self, series=None):
+        if series is None:
+            series = self.snapshot()
+        samples = []
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values[:-1]):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", _labels(self.labelnames, key, ('le', _number(bound))),
+                                cumulative))
+            samples.append((f"{self.name}_sum", _labels(self.labelnames, key), values[-1]))
+            samples.append((f"{self.name}_count", _labels(self.labelnames, key), cumulative))
+        return samples
+
+
+class Gauge:
+    """Value read from ``callback`` at scrape time.
+
+    The callback returns a number, or a dict of label-value tuples to numbers.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        value = self.callback()
+        if isinstance(value, dict):
+            return [(self.name, _labels(self.labelnames, key), v) for key, v in sorted(value.items())]
+        return [(self.name, '', value)]
+
+
+class Registry:
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def _all(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def clear(self):
+        """Forget counts inherited from the master in a freshly forked worker"""
+        for metric in self._all():
+            if metric.type != 'gauge':
+                metric.clear()
+
+    # ---------- Multiprocess ----------
+    def write_snapshot(self):
+        """Save this process's metrics to ``directory`` for the other workers' scrapes"""
+        if not self.directory:
+            return
+        pid = os.getpid()
+        data = {"pid": pid, "totals": {}, "gauges": {}}
+        for metric in self._all():
+            try:
+                if metric.type == 'gauge':
+                    data["gauges"][metric.name] = metric.samples()
+                else:
+                    data["totals"][metric.name] = [[list(key), value] for key, value in metric.snapshot().items()]
+            except Exception:
+                continue  # reported as unavailable when this worker renders
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{pid}.json")
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(f"{path}.tmp", path)
+
+    def _read_snapshots(self):
+        snapshots = []
+        for entry in os.listdir(self.directory):
+            if not entry.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, entry)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # removed or replaced mid-read
+        return snapshots
+
+    def ensure_flusher(self):
+        """Start the snapshot thread in this process (once per worker)"""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_forever, name="metrics-flush", daemon=True).start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                logger.error("❌ Writing metrics snapshot failed: %s", e)
+
+    # ---------- Exposition ----------
+    def render(self):
+        lines = []
+        snapshots = None
+        if self.directory:
+            self.write_snapshot()
+            snapshots = self._read_snapshots()
+            live = [s for s in snapshots if s["pid"] == os.getpid() or _alive(s["pid"])]
+        for metric in self._all():
+            try:
+                if snapshots is None:
+                    samples = metric.samples()
+                elif metric.type == 'gauge':
+                    samples = [(name, _with_pid(labels, s["pid"]), value)
+                               for s in sorted(live, key=lambda s: s["pid"])
+                               for name, labels, value in s["gauges"].get(metric.name, ())]
+                else:
+                    merged = {}
+                    for s in snapshots:
+                        for key, value in s["totals"].get(metric.name, ()):
+                            key = tuple(key)
+                            merged[key] = metric.combine(merged[key], value) if key in merged else value
+                    samples = metric.samples(merged)
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry(os.getenv('METRICS_DIR') or None, float(os.getenv('METRICS_FLUSH_SECONDS', 5)))
+
+http_request_seconds = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Flask request latency', ('route', 'method', 'status')))
+db_query_seconds = REGISTRY.register(Histogram(
+    'db_query_duration_seconds', 'SQL statement latency', ('operation',), buckets=DB_BUCKETS))
+send_seconds = REGISTRY.register(Histogram(
+    'whatsapp_send_duration_seconds', 'Provider send latency, excluding rate-limit waits',
+    ('provider', 'outcome')))
+send_total = REGISTRY.register(Counter(
+    'whatsapp_sends_total', 'WhatsApp sends by provider and outcome', ('provider', 'outcome')))
+provider_responses = REGISTRY.register(Counter(
+    'whatsapp_provider_responses_total', 'Provider HTTP responses by status code', ('provider', 'status')))
+ratelimit_wait_seconds = REGISTRY.register(Counter(
+    'whatsapp_ratelimit_wait_seconds_total', 'Time spent waiting for a rate-limit slot', ('provider',)))
+
+
+def record_send(provider, ok, seconds):
+    outcome = 'sent' if ok else 'failed'
+    send_seconds.observe(seconds, provider, outcome)
+    send_total.inc(provider, outcome)
+
+
+def record_response(provider, status):
+    provider_responses.inc(provider, status)
+
+
+def register_gauge(name, documentation, callback, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, callback, labelnames))
+
+
+def register_counter(name, documentation, callback, labelnames=()):
+    return REGISTRY.register(CallbackCounter(name, documentation, callback, labelnames))
+
+
+def resident_memory_bytes():
+    """Current RSS of this process (Linux), or peak RSS where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+register_gauge('process_resident_memory_bytes', 'Resident memory of this worker process', resident_memory_bytes)
+
+
+def instrument_app(app):
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        REGISTRY.ensure_flusher()
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            http_request_seconds.observe(time.perf_counter() - started, route, request.method,
+                                         response.status_code)
+        return response
+
+
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def observe_query(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+        db_query_seconds.observe(time.perf_counter() - started, operation)
+
+    @event.listens_for(engine, "handle_error")
+    def discard_query_timer(context):
+        stack = context.connection.info.get('query_started') if context.connection is not None else None
+        if stack:
+            stack.pop()
@@ -1,6 +1,8 @@
 # models.py
 
-from sqlalchemy import Column, Integer, String, Boolean
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, Float, ForeignKey, UniqueConstraint, insert, update
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -13,3 +15,109 @@ class Guest(Base):
     password = Column(String, nullable=False)
     invite_sent = Column(Boolean, default=False)
     rsvp_status = Column(String, default="pending")
+
+class OutboundMessage(Base):
+    """A WhatsApp message waiting to be sent by the background dispatcher"""
+    __tablename__ = 'outbound_messages'
+    id = Column(Integer, primary_key=True)
+    guest_id = Column(Integer, ForeignKey('guests.id', ondelete='SET NULL'), nullable=True, index=True)
+    phone = Column(String, nullable=False)
+    message = Column(Text, nullable=False)
+    # queued -> sending -> sent | failed
+    status = Column(String, default="queued", nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=1, nullable=False)
+    retry_delay = Column(Integer, default=5, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+class ProviderRateLimit(Base):
+    """Shared token-bucket state per WhatsApp provider (GCRA theoretical arrival time)"""
+    __tablename__ = 'provider_rate_limits'
+    provider = Column(String, primary_key=True)
+    tat = Column(Float, nullable=False, default=0.0)
+    version = Column(Integer, nullable=False, default=0)
+
+class InviteBatch(Base):
+    """Progress of a server-side bulk invite run"""
+    __tablename__ = 'invite_batches'
+    id = Column(Integer, primary_key=True)
+    # running -> completed | interrupted
+    status = Column(String, default="running", nullable=False)
+    total = Column(Integer, default=0, nullable=False)
+    sent = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    concurrency = Column(Integer, default=1, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+class MessageStatus(Base):
+    """Latest delivery state of one provider message, fed by send results and webhooks"""
+    __tablename__ = 'message_statuses'
+    __table_args__ = (UniqueConstraint('provider', 'message_id', name='uq_message_statuses_provider_message'),)
+    id = Column(Integer, primary_key=True)
+    provider = Column(String, nullable=False)
+    message_id = Column(String, nullable=False)
+    guest_id = Column(Integer, ForeignKey('guests.id', ondelete='SET NULL'), nullable=True, index=True)
+    phone = Column(String, nullable=True)
+    # sent -> delivered -> read, or failed/undelivered; never moves backwards
+    status = Column(String, nullable=False)
+    status_rank = Column(Integer, nullable=False, default=0)
+    error_code = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    delivered_at = Column(DateTime, nullable=True)
+    read_at = Column(DateTime, nullable=True)
+
+class GuestChange(Base):
+    """Append-only log of guest mutations; the id is the admin change-feed version"""
+    __tablename__ = 'guest_changes'
+    __table_args__ = {'sqlite_autoincrement': True}  # never reuse ids after pruning
+    id = Column(Integer, primary_key=True)
+    # No foreign key: the row outlives the guest it reports deleted
+    guest_id = Column(Integer, nullable=True)
+    # added | updated | rsvp | invited | deleted, or cleared (every guest, guest_id NULL)
+    kind = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class Counter(Base):
+    """Named integer counters maintained in the same transaction as the writes they track"""
+    __tablename__ = 'counters'
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+# Bumped by every write to the guests table; used for cheap ETags
+GUESTS_VERSION = 'guests_version'
+
+def ensure_counters(session, *names):
+    """Create any missing counter rows (run once at startup)"""
+    existing = {name for (name,) in session.query(Counter.name).filter(Counter.name.in_(names))}
+    for name in names:
+        if name not in existing:
+            session.add(Counter(name=name, value=0))
+    session.commit()
+
+def bump_counter(session, name, delta=1):
+    """Add ``delta`` to a counter as part of the caller's transaction"""
+    session.execute(update(Counter).where(Counter.name == name).values(value=Counter.value + delta))
+
+def read_counter(session, name):
+    return session.query(Counter.value).filter(Counter.name == name).scalar() or 0
+
+def bump_guest_version(session):
+    bump_counter(session, GUESTS_VERSION)
+
+def record_guest_changes(session, kind, guest_ids=(None,)):
+    """Bump guests_version and log one change per guest, in the caller's transaction.
+
+    The counter UPDATE runs first and row-locks the counter until commit, so
+    change ids are handed out in commit order and a reader following
+    ``id > since`` never skips a change that commits late.
+    """
+    bump_guest_version(session)
+    now = datetime.utcnow()
+    session.execute(insert(GuestChange), [{"guest_id": guest_id, "kind": kind, "created_at": now}
+                                          for guest_id in guest_ids])
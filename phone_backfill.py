@@ -0,0 +1,110 @@
+# phone_backfill.py
+"""Re-normalise stored guest phone numbers to canonical E.164.
+
+Rows written before ``normalize_phone`` handled brackets, dots, ``00`` and
+``+27 (0)`` prefixes can hold the same number in different spellings, which
+the unique index on ``guests.phone`` cannot catch. This walks the table in
+id order, ``--chunk-size`` rows per transaction, and rewrites every phone
+whose canonical form differs. Queued invite jobs for those guests get the
+new number too.
+
+A row whose canonical number already belongs to another guest is a
+collision. It is reported and left untouched, to be merged or deleted by
+hand. So is a row that is still not a valid number after normalising.
+
+Usage:
+    python phone_backfill.py --dry-run        # report only
+    python phone_backfill.py --chunk-size 1000
+
+Uses DATABASE_URL like the app. Exits 1 when collisions or invalid numbers
+were found.
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+from sqlalchemy import update
+
+from models import Guest, OutboundMessage, record_guest_changes
+from phones import is_valid_phone, normalize_phone
+from storage import Storage
+
+logger = logging.getLogger("phone_backfill")
+
+
+def backfill(session_factory, chunk_size=500, dry_run=False):
+    report = {"scanned": 0, "updated": 0, "unchanged": 0, "collisions": [], "invalid": []}
+    claimed = {}  # canonical phone -> guest id, for rows rewritten earlier in this run
+    last_id = 0
+    while True:
+        session = session_factory()
+        try:
+            rows = (session.query(Guest.id, Guest.phone).filter(Guest.id > last_id)
+                    .order_by(Guest.id).limit(chunk_size).all())
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            report["scanned"] += len(rows)
+
+            pending = {}
+            for guest_id, phone in rows:
+                canonical = normalize_phone(phone)
+                if canonical == phone:
+                    report["unchanged"] += 1
+                elif not is_valid_phone(canonical):
+                    report["invalid"].append({"id": guest_id, "phone": phone})
+                else:
+                    pending[guest_id] = (phone, canonical)
+
+            owners = dict(session.query(Guest.phone, Guest.id).filter(
+                Guest.phone.in_([canonical for _, canonical in pending.values()]))) if pending else {}
+            changes = []
+            for guest_id, (phone, canonical) in pending.items():
+                owner = claimed.get(canonical, owners.get(canonical))
+                if owner is not None and owner != guest_id:
+                    report["collisions"].append({"id": guest_id, "phone": phone, "canonical": canonical,
+                                                 "conflicts_with": owner})
+                    continue
+                claimed[canonical] = guest_id
+                changes.append((guest_id, phone, canonical))
+
+            if changes and not dry_run:
+                for guest_id, phone, canonical in changes:
+                    session.execute(update(Guest).where(Guest.id == guest_id).values(phone=canonical))
+                    session.execute(update(OutboundMessage)
+                                    .where(OutboundMessage.guest_id == guest_id, OutboundMessage.status == "queued")
+                                    .values(phone=canonical))
+                record_guest_changes(session, 'updated', [guest_id for guest_id, _, _ in changes])
+                session.commit()
+            report["updated"] += len(changes)
+            logger.info("📞 Up to guest %s: %s scanned, %s %s", last_id, report["scanned"], report["updated"],
+                        "would change" if dry_run else "updated")
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Normalise stored guest phone numbers to E.164")
+    parser.add_argument('--chunk-size', type=int, default=500, help="rows per transaction")
+    parser.add_argument('--dry-run', action='store_true', help="report without writing")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    storage = Storage()
+    storage.create_schema()
+    report = backfill(storage.session_factory, chunk_size=max(1, args.chunk_size), dry_run=args.dry_run)
+    print(json.dumps(report, indent=2))
+    for collision in report["collisions"]:
+        logger.warning("⚠️ Guest %s (%s) collides with guest %s as %s", collision["id"], collision["phone"],
+                       collision["conflicts_with"], collision["canonical"])
+    return 1 if report["collisions"] or report["invalid"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
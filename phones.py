@@ -0,0 +1,64 @@
+# phones.py
+"""Phone number normalisation and the provider-specific formats used by the senders.
+
+Numbers are canonicalised to E.164 (``+27646191448``) once, where they enter
+the system: guest writes, logins and webhooks. ``guests.phone`` only ever
+holds that form, so lookups are exact matches on its unique index, and the
+provider formats below are a constant-time prefix or slice of it.
+"""
+
+import os
+import re
+
+PHONE_PATTERN = re.compile(r"^\+\d{10,15}$")
+NON_DIGITS = re.compile(r"\D")
+
+# Numbers typed without a country code are assumed to be South African
+DEFAULT_COUNTRY_CODE = os.getenv('DEFAULT_COUNTRY_CODE', '27')
+
+
+def normalize_phone(phone: str) -> str:
+    """Canonical E.164 form of a typed number, or "" when it has no digits.
+
+    Spaces, dashes, dots and brackets are dropped. A ``00`` international
+    prefix becomes ``+``, and a national trunk ``0`` is replaced by the
+    country code, including the ``+27 (0)64...`` style.
+    """
+    if not phone:
+        return ""
+    phone = str(phone).strip()
+    international = phone.startswith("+")
+    digits = NON_DIGITS.sub("", phone)
+    if not digits:
+        return ""
+    if not international and digits.startswith("00"):
+        digits, international = digits[2:], True
+
+    country = DEFAULT_COUNTRY_CODE
+    if international or digits.startswith(country):
+        if digits.startswith(country + "0"):
+            digits = country + digits[len(country) + 1:]  # +27 (0)64... -> +2764...
+        return "+" + digits
+    if digits.startswith("0"):
+        return "+" + country + digits[1:]  # 0646191448 -> +27646191448
+    return "+" + country + digits  # 646191448 -> +27646191448
+
+
+def is_valid_phone(phone):
+    """True for a normalised '+' followed by 10-15 digits"""
+    return bool(phone and PHONE_PATTERN.match(phone))
+
+
+def plus_phone(phone):
+    """International format with a leading '+' (Authkey); canonical numbers pass straight through"""
+    return phone if phone.startswith('+') else normalize_phone(phone)
+
+
+def wasender_phone(phone):
+    """WasenderAPI needs the country code without '+'"""
+    return plus_phone(phone)[1:]
+
+
+def whatsapp_address(phone):
+    """Twilio's WhatsApp address form"""
+    return 'whatsapp:' + plus_phone(phone)
@@ -0,0 +1,148 @@
+# ratelimit.py
+"""Per-provider token-bucket rate limiting shared across worker processes.
+
+Each provider's bucket is stored as a single GCRA "theoretical arrival time"
+row in the database, updated with a compare-and-swap on ``version``. Every
+process and thread that shares the database therefore draws from the same
+bucket. A send reserves the next free slot and sleeps until it arrives, so
+sends go out at the configured rate instead of a fixed worst-case spacing.
+"""
+
+import email.utils
+import logging
+import time
+
+from sqlalchemy import case, update
+from sqlalchemy.exc import IntegrityError
+
+from models import ProviderRateLimit
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(response, default=60):
+    """Read the back-off hint from a 429 response body or Retry-After header"""
+    try:
+        body = response.json()
+    except Exception:
+        body = None
+    return retry_after_value(body, response.headers, default)
+
+
+def retry_after_value(body, headers, default=60):
+    """Back-off hint from an already-decoded body and a headers mapping"""
+    if isinstance(body, dict) and body.get('retry_after') is not None:
+        try:
+            return max(0.0, float(body['retry_after']))
+        except (TypeError, ValueError):
+            pass
+
+    header = headers.get('Retry-After') if headers is not None else None
+    if header:
+        header = header.strip()
+        if header.isdigit():
+            return float(header)
+        try:
+            when = email.utils.parsedate_to_datetime(header)
+            return max(0.0, when.timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return float(default)
+
+
+class RateLimiter:
+    def __init__(self, session_factory, providers, max_cas_attempts=20):
+        self._session_factory = session_factory
+        self._max_cas_attempts = max_cas_attempts
+        self.limits = {}
+        for name, config in providers.items():
+            limit = config.get('rate_limit')
+            if limit and limit.get('per_minute'):
+                self.limits[name] = (60.0 / float(limit['per_minute']), max(1, int(limit.get('burst', 1))))
+
+    def _limit(self, provider):
+        # Unconfigured providers are unthrottled but still honour retry_after
+        return self.limits.get(provider, (0.0, 1))
+
+    def reserve(self, provider):
+        """Claim the next send slot and return how many seconds to wait for it"""
+        interval, burst = self._limit(provider)
+        tolerance = (burst - 1) * interval
+
+        session = self._session_factory()
+        try:
+            for _ in range(self._max_cas_attempts):
+                now = time.time()
+                row = session.get(ProviderRateLimit, provider)
+                if row is None:
+                    try:
+                        session.add(ProviderRateLimit(provider=provider, tat=now + interval, version=0))
+                        session.commit()
+                        return 0.0
+                    except IntegrityError:
+                        # Another process created the bucket first
+                        session.rollback()
+                        continue
+
+                tat = max(row.tat, now)
+                delay = max(0.0, tat - tolerance - now)
+                result = session.execute(
+                    update(ProviderRateLimit)
+                    .where(ProviderRateLimit.provider == provider, ProviderRateLimit.version == row.version)
+                    .values(tat=tat + interval, version=row.version + 1)
+                )
+                session.commit()
+                if result.rowcount == 1:
+                    return delay
+                session.expire_all()
+
+            logger.warning("⚠️ Rate limiter contention for %s, sending without a slot", provider)
+            return 0.0
+        finally:
+            session.close()
+
+    def acquire(self, provider):
+        """Block until the provider's bucket allows another send"""
+        delay = self.reserve(provider)
+        if delay > 0:
+            logger.info("⏳ Rate limit: waiting %.1fs for a %s send slot", delay, provider)
+            time.sleep(delay)
+
+    def penalize(self, provider, retry_after):
+        """Push the provider's next slot out by the server-supplied retry_after"""
+        interval, burst = self._limit(provider)
+        tolerance = (burst - 1) * interval
+        tat = time.time() + retry_after + tolerance
+        # Take the max in SQL, so a reserve() committed since anyone last read
+        # the row is never pulled earlier and its slot never handed out twice
+        push_back = (update(ProviderRateLimit)
+                     .where(ProviderRateLimit.provider == provider)
+                     .values(tat=case((ProviderRateLimit.tat < tat, tat), else_=ProviderRateLimit.tat),
+                             version=ProviderRateLimit.version + 1))
+
+        session = self._session_factory()
+        try:
+            if session.execute(push_back).rowcount == 0:
+                try:
+                    session.add(ProviderRateLimit(provider=provider, tat=tat, version=0))
+                    session.commit()
+                except IntegrityError:
+                    # Another process created the bucket first
+                    session.rollback()
+                    session.execute(push_back)
+            session.commit()
+        finally:
+            session.close()
+        logger.warning("🚦 %s rate limited - holding sends for %.0f seconds", provider, retry_after)
+
+    def wait_time(self, provider):
+        """Seconds until the provider's next free slot, without reserving it"""
+        interval, burst = self._limit(provider)
+        session = self._session_factory()
+        try:
+            row = session.get(ProviderRateLimit, provider)
+            if row is None:
+                return 0.0
+            return max(0.0, row.tat - (burst - 1) * interval - time.time())
+        finally:
+            session.close()
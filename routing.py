@@ -0,0 +1,257 @@
+# routing.py
+"""Provider routing with circuit breakers and failover.
+
+``ProviderRouter`` sits above the per-provider senders. It keeps a rolling
+window of outcomes and an EWMA latency for each provider and opens a
+provider's circuit after ``failure_threshold`` consecutive failures, or when
+the windowed error rate reaches ``error_rate``. An open circuit is skipped
+for ``open_seconds``. After that one trial send is let through (half-open),
+and its result closes or re-opens the circuit.
+
+Only provider failures (errors, timeouts, 5xx) count against a circuit. A
+sender returns ``REJECTED`` when the provider answered but refused the
+message, e.g. a 422 for a bad number, or ``THROTTLED`` for a 429 rate
+limit. Both fail the send but show the provider is up. A throttled send can
+be retried once the rate limiter allows it, so the router passes
+``THROTTLED`` on when no provider accepted the message. With a single routed provider there
+is nothing to fail over to, so the breaker is off and every send reaches
+the provider; outcomes and latency are still tracked.
+
+A send tries the allowed providers in order and stops at the first success.
+A provider whose rate-limit wait exceeds ``max_wait`` is tried after the
+others instead of blocking the send. The order is the configured priority,
+or lowest recent latency first with ``strategy='latency'``.
+
+With ``hedge_after`` set, a send still running after that many seconds is
+raced against the next provider and the first success wins. Hedging can
+deliver the invite twice when both providers succeed, so it is off by
+default.
+
+Health is tracked per process.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class Rejected:
+    """Falsy send result for a message the provider answered but refused"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return self.name
+
+
+REJECTED = Rejected('REJECTED')
+THROTTLED = Rejected('THROTTLED')  # 429: worth retrying after the rate-limit wait
+
+# Provider HTTP statuses that refuse one message rather than signal an outage
+REJECTED_STATUSES = frozenset({400, 422, 429})
+
+
+def failed_send(status):
+    """Send result for a non-success HTTP status"""
+    if status == 429:
+        return THROTTLED
+    return REJECTED if status in REJECTED_STATUSES else False
+
+
+def provider_up(result):
+    """Whether a send result says the provider itself is working"""
+    return bool(result) or isinstance(result, Rejected)
+
+
+class ProviderHealth:
+    def __init__(self, name, window=20, min_samples=10, failure_threshold=5, error_rate=0.5,
+                 open_seconds=30.0, latency_alpha=0.2):
+        self.name = name
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate
+        self.open_seconds = open_seconds
+        self.latency_alpha = latency_alpha
+        self.outcomes = deque(maxlen=window)
+        self.latency = None
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+    def available(self, now):
+        if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+            self.trial_in_flight = False
+        return self.state == CLOSED or (self.state == HALF_OPEN and not self.trial_in_flight)
+
+    def claim(self, now):
+        """Reserve a send; a half-open circuit lets exactly one trial through"""
+        if not self.available(now):
+            return False
+        if self.state == HALF_OPEN:
+            self.trial_in_flight = True
+        return True
+
+    def observe(self, ok, seconds):
+        self.outcomes.append(ok)
+        self.latency = seconds if self.latency is None else (
+            self.latency_alpha * seconds + (1 - self.latency_alpha) * self.latency)
+
+    def record(self, ok, seconds, now):
+        self.observe(ok, seconds)
+        if ok:
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                logger.info("🟢 %s circuit closed", self.name)
+            self.state = CLOSED
+            self.trial_in_flight = False
+            return
+
+        self.consecutive_failures += 1
+        tripped = (self.consecutive_failures >= self.failure_threshold or
+                   (len(self.outcomes) >= self.min_samples and self.error_rate() >= self.error_rate_threshold))
+        if self.state == HALF_OPEN or (self.state == CLOSED and tripped):
+            logger.warning("🔴 %s circuit opened for %.0fs (%s consecutive failures, %.0f%% errors)",
+                           self.name, self.open_seconds, self.consecutive_failures, self.error_rate() * 100)
+            self.state = OPEN
+            self.opened_at = now
+            self.trial_in_flight = False
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "error_rate": round(self.error_rate(), 3),
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "samples": len(self.outcomes),
+        }
+
+
+class ProviderRouter:
+    def __init__(self, providers, send_funcs=None, rate_limiter=None, strategy='priority', max_wait=5.0,
+                 hedge_after=None, **health_options):
+        self.providers = list(providers)
+        self._send_funcs = send_funcs or {}
+        self._rate_limiter = rate_limiter
+        self.strategy = strategy
+        self.max_wait = max_wait
+        self.hedge_after = hedge_after
+        # Opening the only provider's circuit would just drop sends
+        self.breaker = len(self.providers) > 1
+        self._health = {name: ProviderHealth(name, **health_options) for name in self.providers}
+        self._lock = threading.Lock()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge") if hedge_after else None
+
+    # ---------- Health ----------
+    def candidates(self):
+        """Providers to try for the next send, best first"""
+        now = time.monotonic()
+        with self._lock:
+            allowed = [name for name in self.providers
+                       if not self.breaker or self._health[name].available(now)]
+            if self.strategy == 'latency':
+                allowed.sort(key=lambda name: self._health[name].latency or 0.0)
+        if len(allowed) > 1 and self._rate_limiter is not None:
+            # Stable sort: providers that would block go last, order otherwise kept
+            allowed.sort(key=lambda name: self._rate_limiter.wait_time(name) > self.max_wait)
+        return allowed
+
+    def claim(self, provider):
+        """Call before sending; False means the circuit no longer allows it"""
+        if not self.breaker:
+            return True
+        with self._lock:
+            health = self._health.get(provider)
+            return health is None or health.claim(time.monotonic())
+
+    def record(self, provider, ok, seconds):
+        """``ok`` is whether the provider worked (see ``provider_up``), not whether the send did"""
+        with self._lock:
+            health = self._health.get(provider)
+            if health is None:
+                return
+            if self.breaker:
+                health.record(ok, seconds, time.monotonic())
+            else:
+                health.observe(ok, seconds)
+
+    def wait_time(self):
+        """Shortest rate-limit wait among the routed providers"""
+        if self._rate_limiter is None:
+            return 0.0
+        return min(self._rate_limiter.wait_time(name) for name in self.providers)
+
+    def states(self):
+        with self._lock:
+            return {name: health.state for name, health in self._health.items()}
+
+    def snapshot(self):
+        with self._lock:
+            return {name: health.snapshot() for name, health in self._health.items()}
+
+    # ---------- Sending ----------
+    def _attempt(self, provider, phone, message):
+        if not self.claim(provider):
+            return False
+        started = time.perf_counter()
+        try:
+            result = self._send_funcs[provider](phone, message)
+        except Exception as e:
+            logger.error("❌ Send via %s raised: %s", provider, e, exc_info=True)
+            result = False
+        self.record(provider, provider_up(result), time.perf_counter() - started)
+        return result
+
+    def send(self, phone, message):
+        """Try providers in order until one accepts the message; THROTTLED if one rate-limited it"""
+        candidates = self.candidates()
+        if not candidates:
+            logger.error("❌ No WhatsApp provider available - all circuits open")
+            return False
+        if self._hedge_pool is not None and len(candidates) > 1:
+            return self._send_hedged(candidates, phone, message)
+
+        outcome = False
+        for index, provider in enumerate(candidates):
+            if index:
+                logger.warning("↪️ Failing over to %s", provider)
+            result = self._attempt(provider, phone, message)
+            if result:
+                return True
+            if result is THROTTLED:
+                outcome = THROTTLED
+        return outcome
+
+    def _send_hedged(self, candidates, phone, message):
+        pending = set()
+        remaining = list(candidates)
+        while remaining or pending:
+            if remaining:
+                provider = remaining.pop(0)
+                pending.add(self._hedge_pool.submit(self._attempt, provider, phone, message))
+            # Wait for a result; launch the next provider early if this one is slow
+            done, pending = wait(pending, timeout=self.hedge_after if remaining else None,
+                                 return_when=FIRST_COMPLETED)
+            if any(future.result() for future in done):
+                return True
+            if not done and remaining:
+                logger.info("🏁 Hedging slow send with %s", remaining[0])
+        return False
@@ -0,0 +1,113 @@
+# static_delivery.py
+"""Cached, precompressed delivery of the HTML pages and assets.
+
+Text files (HTML, CSS, JS, JSON, SVG) are read once and compressed with gzip
+and, when the ``brotli`` package is installed, brotli. The encoded bodies are
+kept in memory keyed by the file's mtime and size, and each request gets the
+best encoding its ``Accept-Encoding`` allows. Every body carries a strong
+ETag derived from its bytes, so revisits are answered with a 304.
+
+Binary files (photos, the song) go through ``send_from_directory``, which
+already handles ETags, ``If-None-Match`` and byte ``Range`` requests.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+
+from flask import Response, request, send_from_directory
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = ('.html', '.css', '.js', '.json', '.svg', '.txt')
+MIN_COMPRESS_BYTES = 512
+
+NO_CACHE = 'no-cache'
+DAILY = 'public, max-age=86400'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def _compress(data):
+    """Encoded bodies for ``data``, keyed by content-coding"""
+    encodings = {'identity': data}
+    if len(data) < MIN_COMPRESS_BYTES:
+        return encodings
+    gzipped = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gzipped) < len(data):
+        encodings['gzip'] = gzipped
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            encodings['br'] = compressed
+    return encodings
+
+
+class StaticFiles:
+    def __init__(self, root='.'):
+        self.root = root
+        self._entries = {}  # path -> (mtime_ns, size, {coding: (body, etag)})
+        self._lock = threading.Lock()
+
+    def preload(self, directory, *filenames):
+        """Compress files up front so the first visitor doesn't pay for it"""
+        for filename in filenames:
+            self._load(os.path.join(self.root, directory, filename))
+        logger.info("🗜️ Precompressed %s static files (%s)",
+                    len(filenames), 'gzip+br' if brotli is not None else 'gzip only')
+
+    def _load(self, path):
+        stat = os.stat(path)
+        entry = self._entries.get(path)
+        if entry and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            return entry[2]
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:20]
+        variants = {}
+        for coding, body in _compress(data).items():
+            etag = digest if coding == 'identity' else f"{digest}-{coding}"
+            variants[coding] = (body, etag)
+        with self._lock:
+            self._entries[path] = (stat.st_mtime_ns, stat.st_size, variants)
+        return variants
+
+    @staticmethod
+    def _negotiate(variants):
+        accepted = request.accept_encodings
+        for coding in ('br', 'gzip'):
+            if coding in variants and accepted[coding]:
+                return coding
+        return 'identity'
+
+    def serve(self, directory, filename, cache_control=NO_CACHE):
+        directory = os.path.join(self.root, directory)
+        path = safe_join(directory, filename)
+        if path is None or not os.path.isfile(path):
+            raise NotFound()
+
+        if not filename.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+            response = send_from_directory(directory, filename, conditional=True)
+            response.headers['Cache-Control'] = cache_control
+            return response
+
+        variants = self._load(path)
+        coding = self._negotiate(variants)
+        body, etag = variants[coding]
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = Response(body, mimetype=mimetype)
+        if coding != 'identity':
+            response.headers['Content-Encoding'] = coding
+        response.headers['Cache-Control'] = cache_control
+        response.vary.add('Accept-Encoding')
+        response.set_etag(etag)
+        return response.make_conditional(request)
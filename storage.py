@@ -0,0 +1,86 @@
+# storage.py
+"""Database engine and session setup.
+
+``DATABASE_URL`` selects the backend (default ``sqlite:///database.db``).
+
+* SQLite connections run in WAL mode with ``synchronous=NORMAL`` and a busy
+  timeout, so RSVP writes wait briefly for the lock instead of failing with
+  "database is locked", and readers never block the writer.
+* Any other URL (e.g. ``postgresql+psycopg2://...``, driver installed
+  separately) gets a QueuePool sized by ``DB_POOL_SIZE`` and
+  ``DB_MAX_OVERFLOW``, with pre-ping and connection recycling.
+
+Routes use the request-scoped ``Session`` registry, which is cleared at the
+end of each request. Background components get the plain
+``session_factory``, so their sessions never alias a request's.
+"""
+
+import logging
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from models import Base
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATABASE_URL = 'sqlite:///database.db'
+
+
+def _sqlite_pragmas(busy_timeout_ms, synchronous):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        cursor.close()
+    return on_connect
+
+
+def create_storage_engine(url):
+    if url.startswith('sqlite'):
+        busy_timeout_ms = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+        engine = create_engine(
+            url,
+            connect_args={"timeout": busy_timeout_ms / 1000.0, "check_same_thread": False},
+        )
+        event.listen(engine, "connect",
+                     _sqlite_pragmas(busy_timeout_ms, os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')))
+        return engine
+
+    return create_engine(
+        url,
+        pool_size=int(os.getenv('DB_POOL_SIZE', 10)),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        pool_recycle=int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        pool_pre_ping=True,
+    )
+
+
+class Storage:
+    def __init__(self, url=None):
+        self.url = url or os.getenv('DATABASE_URL', DEFAULT_DATABASE_URL)
+        self.engine = create_storage_engine(self.url)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.Session = scoped_session(self.session_factory)
+        logger.info("🗄️ Database backend: %s", self.engine.dialect.name)
+
+    def create_schema(self):
+        Base.metadata.create_all(self.engine)
+
+    def init_app(self, app):
+        @app.teardown_appcontext
+        def remove_session(exception=None):
+            self.Session.remove()
+
+    def dispose(self, close=True):
+        """Drop pooled connections.
+
+        In a freshly forked worker pass ``close=False``: the inherited
+        connections belong to the parent, and closing them from the child
+        would tear down the parent's sockets too.
+        """
+        self.Session.remove()
+        self.engine.dispose(close=close)
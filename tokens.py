@@ -0,0 +1,80 @@
+# tokens.py
+"""Stateless, HMAC-signed guest session tokens.
+
+A token is ``<payload>.<signature>``, both base64url without padding. The
+payload is compact JSON ``{"g": guest_id, "p": phone, "e": expiry}`` and the
+signature is HMAC-SHA256 over the encoded payload. Verifying needs only the
+secret, so guest endpoints can authenticate a request without a DB read.
+
+``SESSION_SECRET`` must be set (and shared by every worker) for tokens to
+survive restarts. Without it a random per-process secret is used, which
+only works across gunicorn workers that were forked from a preloaded
+master; gunicorn.conf.py refuses to start without preload or a secret.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+class TokenSigner:
+    def __init__(self, secret=None, ttl=30 * 24 * 3600):
+        if not secret:
+            logger.warning("⚠️ SESSION_SECRET not set - guest sessions will not survive a restart")
+            secret = secrets.token_hex(32)
+        self._key = secret.encode() if isinstance(secret, str) else secret
+        self.ttl = ttl
+
+    def _sign(self, payload):
+        return _b64encode(hmac.new(self._key, payload.encode('ascii'), hashlib.sha256).digest())
+
+    def issue(self, guest_id, phone):
+        """Return (token, expires_at epoch seconds)"""
+        expires_at = int(time.time() + self.ttl)
+        body = json.dumps({"g": guest_id, "p": phone, "e": expires_at}, separators=(',', ':'))
+        payload = _b64encode(body.encode())
+        return f"{payload}.{self._sign(payload)}", expires_at
+
+    def verify(self, token):
+        """{"guest_id", "phone", "expires_at"} for a valid, unexpired token, else None"""
+        if not isinstance(token, str) or not token.isascii() or token.count('.') != 1:
+            return None
+        payload, signature = token.split('.')
+        if not hmac.compare_digest(self._sign(payload), signature):
+            return None
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            return None
+        if not isinstance(claims, dict) or claims.get("e", 0) < time.time():
+            return None
+        return {"guest_id": claims.get("g"), "phone": claims.get("p"), "expires_at": claims.get("e")}
+
+
+def signer_from_env():
+    return TokenSigner(os.getenv('SESSION_SECRET'), ttl=int(os.getenv('SESSION_TOKEN_TTL', 30 * 24 * 3600)))
+
+
+def bearer_token(request):
+    """Token from ``Authorization: Bearer ...`` or a ``token`` field in the JSON body"""
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[7:].strip()
+    data = request.get_json(silent=True)
+    token = data.get('token') if isinstance(data, dict) else None
+    return token if isinstance(token, str) else None
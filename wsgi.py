@@ -0,0 +1,21 @@
+# wsgi.py
+"""Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module runs the one-time startup (schema, counters, config
+logging). With ``preload_app`` that happens once in the gunicorn master, and
+the forked workers share the loaded code copy-on-write.
+
+This is the production entry point, so it defaults ``APP_ENV`` to
+production (INFO logging with redaction and sampling, see log_config.py)
+before the app configures logging.
+"""
+
+import os
+
+os.environ.setdefault('APP_ENV', 'production')
+
+from app import create_app  # noqa: E402
+
+app = create_app()